@@ -0,0 +1,101 @@
+"""
+Micro-benchmark of the json work done per turn with each available codec backend.
+
+A turn decodes one OpenWeather and one Bing response, decodes the tool call arguments and
+encodes the WeatherData tool message.
+
+    python benchmarks/bench_codec.py --number 2000
+"""
+
+import argparse
+import json
+import timeit
+
+from function_calling_weather_bot import codec
+from function_calling_weather_bot.codec import BingImageResponse, OpenWeatherResponse
+from function_calling_weather_bot.utils import WeatherData
+
+OPEN_WEATHER_BODY = json.dumps(
+    {
+        "coord": {"lon": -116.2035, "lat": 43.6135},
+        "weather": [{"id": 800, "main": "Clear", "description": "clear sky", "icon": "01d"}],
+        "base": "stations",
+        "main": {"temp": 291.5, "feels_like": 290.6, "temp_min": 289.8, "temp_max": 293.2, "pressure": 1016, "humidity": 45},
+        "visibility": 10000,
+        "wind": {"speed": 3.6, "deg": 320},
+        "clouds": {"all": 0},
+        "dt": 1716500000,
+        "sys": {"type": 2, "id": 2000000, "country": "US", "sunrise": 1716466000, "sunset": 1716520000},
+        "timezone": -21600,
+        "id": 5586437,
+        "name": "Boise",
+        "cod": 200,
+    }
+).encode()
+
+BING_BODY = json.dumps(
+    {
+        "_type": "Images",
+        "totalEstimatedMatches": 900,
+        "value": [
+            {
+                "name": f"Clear sky over Boise {i}",
+                "webSearchUrl": f"https://www.bing.com/images/search?q=clear+sky+boise&id={i}",
+                "thumbnailUrl": f"https://tse1.mm.bing.net/th?id=OIP.{i:032x}&pid=Api",
+                "datePublished": "2023-05-01T12:00:00.0000000Z",
+                "contentUrl": f"https://example.com/images/boise-{i}.jpg",
+                "hostPageUrl": f"https://example.com/boise-{i}",
+                "contentSize": "245123 B",
+                "encodingFormat": "jpeg",
+                "width": 1920,
+                "height": 1080,
+                "thumbnail": {"width": 474, "height": 266},
+                "imageId": f"{i:040x}",
+                "accentColor": "2B6BA3",
+            }
+            for i in range(35)
+        ],
+    }
+).encode()
+
+TOOL_ARGUMENTS = '{"city_name": "Boise", "country": "US"}'
+
+
+def turn():
+    weather = codec.decode(OPEN_WEATHER_BODY, OpenWeatherResponse)
+    images = codec.decode(BING_BODY, BingImageResponse)
+    codec.loads(TOOL_ARGUMENTS)
+    weather_data = WeatherData(
+        description=weather.weather[0].description,
+        location=weather.name,
+        country_code=weather.sys.country,
+        icon="",
+        temperature=weather.main.temp,
+    )
+    codec.dumps(weather_data)
+    return images
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark json codec backends")
+    parser.add_argument("--number", type=int, default=2000, help="Turns per repeat")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of repeats, best is reported")
+    args = parser.parse_args()
+
+    results = {}
+    for backend in codec.BACKENDS:
+        try:
+            codec.set_backend(backend)
+        except ValueError:
+            print(f"{backend:>8}: not installed")
+            continue
+        best = min(timeit.repeat(turn, number=args.number, repeat=args.repeat))
+        results[backend] = best / args.number * 1e6
+
+    baseline = results["json"]
+    for backend, us_per_turn in results.items():
+        print(f"{backend:>8}: {us_per_turn:8.1f} us/turn  ({baseline / us_per_turn:.1f}x vs json)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+"""
+Soak test of ConversationHandler with synthetic users against local stand-in upstreams.
+
+N users hold multi-turn conversations (new cities, follow ups, several cities at once, unknown
+cities, exits) at a target rate of turns per second. OpenAI, OpenWeather and Bing are replaced by
+a local HTTP server in a child process with configurable latency and error rate, so a run costs
+nothing and only measures the bot. Every `--report-every` seconds a row with throughput, latency percentiles,
+error rate, RSS and the longest conversation history is printed, followed by a summary of the
+whole run.
+
+    python benchmarks/soak.py --users 20 --rate 10 --duration 3600 --out soak.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from function_calling_weather_bot import ICONS, console, metrics, services_spec
+from function_calling_weather_bot.console import LogLevel
+from function_calling_weather_bot.conversation_handler import APOLOGY, ConversationHandler
+from function_calling_weather_bot.speculation import extract_locations
+
+CITIES = [
+    ("Boise", "US"),
+    ("Seattle", "US"),
+    ("Denver", "US"),
+    ("Austin", "US"),
+    ("Chicago", "US"),
+    ("New York", "US"),
+    ("San Francisco", "US"),
+    ("Toronto", "CA"),
+    ("Vancouver", "CA"),
+    ("Mexico City", "MX"),
+    ("London", "GB"),
+    ("Paris", "FR"),
+    ("Berlin", "DE"),
+    ("Madrid", "ES"),
+    ("Rome", "IT"),
+    ("Oslo", "NO"),
+    ("Cairo", "EG"),
+    ("Nairobi", "KE"),
+    ("Mumbai", "IN"),
+    ("Tokyo", "JP"),
+    ("Seoul", "KR"),
+    ("Sydney", "AU"),
+    ("Auckland", "NZ"),
+    ("Lima", "PE"),
+    ("Santiago", "CL"),
+]
+KNOWN_CITIES = {name.lower(): country for name, country in CITIES}
+UNKNOWN_CITIES = ["Atlantis", "El Dorado", "Gotham", "Narnia", "Springfield Heights"]
+
+FOLLOW_UPS = [
+    "Should I bring a jacket?",
+    "Is that warmer than yesterday?",
+    "What should I wear?",
+    "Thanks, anything else I should know?",
+]
+
+# relative weight of each kind of turn, a conversation ends at the first exit
+TURN_KINDS = {"city": 50, "follow_up": 25, "multi_city": 10, "unknown_city": 8, "exit": 7}
+
+
+def next_user_input() -> str | None:
+    """A random user input, None to end the conversation."""
+    kind = random.choices(list(TURN_KINDS), weights=list(TURN_KINDS.values()))[0]
+    if kind == "city":
+        return f"What's the weather in {random.choice(CITIES)[0]}?"
+    if kind == "follow_up":
+        return random.choice(FOLLOW_UPS)
+    if kind == "multi_city":
+        first, second = random.sample(CITIES, 2)
+        return f"Compare the weather in {first[0]} and in {second[0]}"
+    if kind == "unknown_city":
+        return f"How about in {random.choice(UNKNOWN_CITIES)}?"
+    return None
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """
+    Answers the OpenAI chat completions, OpenWeather current weather and Bing image search
+    requests the bot makes, with the same response shapes as the real APIs.
+    """
+
+    protocol_version = "HTTP/1.1"
+    latency = 0.02
+    error_rate = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _wait(self) -> bool:
+        # roughly exponential latency with a slow tail, returns False to fail the request
+        time.sleep(random.expovariate(1 / self.latency) * (10 if random.random() < 0.01 else 1))
+        return random.random() >= self.error_rate
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if not self._wait():
+            return self._send(500, {"message": "stand-in error"})
+
+        if url.path == "/data/2.5/weather":
+            city, _, _ = query.get("q", "").partition(",")
+            if (country := KNOWN_CITIES.get(city.lower())) is None:
+                return self._send(404, {"cod": "404", "message": "city not found"})
+            icon = random.choice(list(ICONS))
+            return self._send(
+                200,
+                {
+                    "coord": {"lon": random.uniform(-180, 180), "lat": random.uniform(-60, 60)},
+                    "weather": [{"id": 800, "main": "Clear", "description": "clear sky", "icon": icon}],
+                    "main": {"temp": random.uniform(260, 310)},
+                    "sys": {"country": country},
+                    "name": city.title(),
+                    "cod": 200,
+                },
+            )
+        if url.path == "/v7.0/images/search":
+            return self._send(
+                200,
+                {
+                    "value": [
+                        {"contentUrl": f"http://stand-in/images/{i}.jpg", "thumbnailUrl": f"http://stand-in/th/{i}.jpg"}
+                        for i in range(5)
+                    ]
+                },
+            )
+        self._send(404, {"message": f"unknown path {url.path}"})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if urlsplit(self.path).path != "/v1/chat/completions":
+            return self._send(404, {"error": {"message": "unknown path"}})
+        if not self._wait():
+            return self._send(500, {"error": {"message": "stand-in error"}})
+
+        messages = body["messages"]
+        # like the real api, reject tool calls that are not answered by tool messages
+        for i, message in enumerate(messages):
+            for tool_call in message.get("tool_calls") or []:
+                if not any(m.get("tool_call_id") == tool_call["id"] for m in messages[i + 1 :]):
+                    return self._send(
+                        400, {"error": {"message": f"tool call {tool_call['id']} has no tool message"}}
+                    )
+
+        last = messages[-1]
+        message = {"role": "assistant", "content": None}
+        locations = extract_locations(last["content"]) if last["role"] == "user" and body.get("tools") else []
+        if locations:
+            message["tool_calls"] = [
+                {
+                    "id": f"call_{uuid.uuid4().hex[:12]}",
+                    "type": "function",
+                    "function": {"name": "get_weather_from_city_name", "arguments": json.dumps({"city_name": loc})},
+                }
+                for loc in locations
+            ]
+        else:
+            message["content"] = f"Stand-in answer to: {str(last['content'])[:80]}"
+
+        prompt_tokens = sum(len(str(m.get("content") or "")) for m in messages) // 4
+        self._send(
+            200,
+            {
+                "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if locations else "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 20, "total_tokens": prompt_tokens + 20},
+            },
+        )
+
+
+def _serve(latency: float, error_rate: float, ports: multiprocessing.Queue) -> None:
+    StandIn.latency = latency
+    StandIn.error_rate = error_rate
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    server.daemon_threads = True
+    ports.put(server.server_port)
+    server.serve_forever()
+
+
+def start_stand_in(latency: float, error_rate: float) -> multiprocessing.Process:
+    """
+    Start the stand-in server in its own process, so it doesn't count towards the RSS and
+    CPU of the bot, and point the bot's upstreams at it.
+    """
+    ports = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve, args=(latency, error_rate, ports), name="stand-in", daemon=True)
+    process.start()
+
+    base_url = f"http://127.0.0.1:{ports.get(timeout=10)}"
+    services_spec.BASE_WEATHER_API = base_url
+    services_spec.BASE_BING_API = base_url + "/v7.0"
+    os.environ["OPENAI_BASE_URL"] = base_url + "/v1"
+    return process
+
+
+def rss_mb() -> float:
+    """Current resident set size, falls back to the peak where /proc is not available."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    values = sorted(values)
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    return {f"p{p}": values[min(len(values) - 1, int(len(values) * p / 100))] for p in (50, 95, 99)}
+
+
+class Soak:
+    """
+    Runs the synthetic users and collects per turn results.
+
+    Args:
+        users (int): Number of concurrent users.
+        rate (float): Target turns per second over all users.
+        handler_kwargs (dict): Passed to every ConversationHandler.
+    """
+
+    def __init__(self, users: int, rate: float, handler_kwargs: dict):
+        self.users = users
+        self.rate = rate
+        self.handler_kwargs = handler_kwargs
+        self.stop = threading.Event()
+
+        self._lock = threading.Lock()
+        # (finished at, latency ms, ok) per turn
+        self._turns: list[tuple[float, float, bool]] = []
+        self._conversations = 0
+        self._max_history = 0
+
+    def _user(self) -> None:
+        handler = None
+        interval = self.users / self.rate
+        next_turn = time.monotonic() + random.uniform(0, interval)
+        while not self.stop.is_set():
+            if self.stop.wait(max(0.0, next_turn - time.monotonic())):
+                break
+            next_turn += interval
+
+            if handler is None:
+                handler = ConversationHandler("stand-in", "stand-in", "stand-in", **self.handler_kwargs)
+                with self._lock:
+                    self._conversations += 1
+            if (user_input := next_user_input()) is None:
+                handler = None
+                continue
+
+            started = time.perf_counter()
+            try:
+                ok = handler.process_input(user_input) != APOLOGY
+            except Exception as err:
+                metrics.incr(f"soak.errors.{type(err).__name__}")
+                ok = False
+            latency_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self._turns.append((time.monotonic(), latency_ms, ok))
+                self._max_history = max(self._max_history, len(handler.llm_handler.messages))
+
+    def window(self, since: float) -> dict:
+        """Stats of the turns finished after `since`."""
+        with self._lock:
+            turns = [turn for turn in self._turns if turn[0] >= since]
+            max_history = self._max_history
+        latencies = [latency for _, latency, _ in turns]
+        errors = sum(not ok for _, _, ok in turns)
+        return {
+            "turns": len(turns),
+            "errors": errors,
+            "error_rate": errors / len(turns) if turns else 0.0,
+            **percentiles(latencies),
+            "max_history": max_history,
+        }
+
+    def run(self, duration: float, report_every: float) -> dict:
+        threads = [threading.Thread(target=self._user, name=f"user-{i}", daemon=True) for i in range(self.users)]
+        for thread in threads:
+            thread.start()
+
+        started = time.monotonic()
+        start_rss = rss_mb()
+        intervals = []
+        print(f"{'time':>6} {'turns/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'rss MB':>8} {'history':>8}")
+        while (elapsed := time.monotonic() - started) < duration:
+            window_start = time.monotonic()
+            self.stop.wait(min(report_every, duration - elapsed))
+            stats = self.window(window_start)
+            row = {
+                "elapsed_s": round(time.monotonic() - started, 1),
+                "throughput": stats["turns"] / (time.monotonic() - window_start),
+                "rss_mb": rss_mb(),
+                **stats,
+            }
+            intervals.append(row)
+            print(
+                f"{row['elapsed_s']:>6.0f} {row['throughput']:>8.1f} {row['p50']:>8.0f} {row['p95']:>8.0f}"
+                f" {row['p99']:>8.0f} {row['error_rate']:>7.1%} {row['rss_mb']:>8.1f} {row['max_history']:>8}"
+            )
+
+        self.stop.set()
+        for thread in threads:
+            thread.join(timeout=30)
+
+        total = self.window(started)
+        counters = metrics.snapshot()["counters"]
+        return {
+            "users": self.users,
+            "target_rate": self.rate,
+            "duration_s": round(time.monotonic() - started, 1),
+            "conversations": self._conversations,
+            "throughput": total["turns"] / (time.monotonic() - started),
+            "rss_start_mb": start_rss,
+            "rss_end_mb": rss_mb(),
+            **total,
+            "errors_by_type": {k.removeprefix("soak.errors."): v for k, v in counters.items() if k.startswith("soak.errors.")},
+            "degraded": {k.removeprefix("degraded."): v for k, v in counters.items() if k.startswith("degraded.")},
+            "intervals": intervals,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak test the bot with synthetic users and stand-in upstreams")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent users")
+    parser.add_argument("--rate", type=float, default=5.0, help="Target turns per second over all users")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds to run for")
+    parser.add_argument("--report-every", type=float, default=10.0, help="Seconds per reported interval")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Mean latency of the stand-in upstreams")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of stand-in requests failing with 500")
+    parser.add_argument("--turn-timeout", type=float, default=20.0, help="Seconds per turn, see --turn-timeout of main.py")
+    parser.add_argument("--speculate", action="store_true", help="Enable speculative weather lookups")
+    parser.add_argument("--out", help="Write the summary and intervals as json to this file")
+    args = parser.parse_args()
+
+    # the bot's warnings for unknown cities and stand-in errors would drown the report
+    console.setLEVEL(LogLevel.CRITICAL)
+    stand_in = start_stand_in(args.latency_ms / 1000, args.error_rate)
+
+    soak = Soak(args.users, args.rate, {"turn_timeout": args.turn_timeout, "speculate": args.speculate})
+    summary = soak.run(args.duration, args.report_every)
+    stand_in.terminate()
+
+    print(
+        f"\n{summary['turns']} turns in {summary['conversations']} conversations,"
+        f" {summary['throughput']:.1f} turns/s (target {args.rate})"
+    )
+    print(f"latency p50 {summary['p50']:.0f}ms p95 {summary['p95']:.0f}ms p99 {summary['p99']:.0f}ms")
+    print(f"errors {summary['errors']} ({summary['error_rate']:.1%}) {summary['errors_by_type']}, degraded {summary['degraded']}")
+    print(
+        f"rss {summary['rss_start_mb']:.1f}MB -> {summary['rss_end_mb']:.1f}MB"
+        f" ({summary['rss_end_mb'] - summary['rss_start_mb']:+.1f}MB)"
+    )
+    if len(intervals := summary["intervals"]) > 1:
+        print(f"p95 drift {intervals[0]['p95']:.0f}ms -> {intervals[-1]['p95']:.0f}ms")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
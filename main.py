@@ -1,15 +1,87 @@
 import argparse
 from os import getenv
 
+from function_calling_weather_bot import console
 from function_calling_weather_bot.conversation_handler import ConversationHandler
+from function_calling_weather_bot.forecast import ForecastCache
+from function_calling_weather_bot.hedging import HedgePolicy
+from function_calling_weather_bot.image_cache import ImageCache
+from function_calling_weather_bot.image_library import ImageLibrary
+from function_calling_weather_bot.keypool import key_id
+from function_calling_weather_bot.profiling import TurnProfiler
+from function_calling_weather_bot.routing import ERROR, PHRASING, TOOL_SELECTION, ModelRouter
+from function_calling_weather_bot.transport import Cassette, install
+from function_calling_weather_bot.utils import get_session, set_hedge_policy
+from function_calling_weather_bot.weather_cache import SpatialWeatherCache
 
 
 def main(args: argparse.Namespace):
-    print("using OpenAI API key:", args.openai_api_key)
+    if args.log_format == "jsonl":
+        console.set_backend("jsonl", stream=open(args.log_file, "a", encoding="utf-8") if args.log_file else None)
+
+    # never print the keys themselves
+    print("using OpenAI API keys:", [key_id(key.partition(":")[0]) for key in (args.openai_api_key or "").split(",") if key])
+
+    # optionally duplicate slow weather and image requests, set once here as it applies to every get_api call
+    if args.hedge:
+        set_hedge_policy(
+            HedgePolicy(delay=args.hedge_delay, max_ratio=args.hedge_max_ratio, max_workers=args.hedge_workers)
+        )
+
+    image_cache = None
+    if args.image_cache_dir:
+        image_cache = ImageCache(
+            cache_dir=args.image_cache_dir,
+            max_bytes=args.image_cache_mb * 1024 * 1024,
+            base_url=args.image_cache_base_url,
+        )
+
+    profiler = None
+    if args.profile:
+        every_n = args.profile_every if args.profile_every is not None else (0 if args.profile_threshold_ms else 1)
+        profiler = TurnProfiler(
+            output_dir=args.profile_dir,
+            every_n=every_n,
+            threshold_ms=args.profile_threshold_ms,
+        )
+
+    cassette = None
+    if args.record:
+        cassette = Cassette(args.record, mode="record")
+    elif args.replay:
+        cassette = Cassette(args.replay, mode="replay", latency=args.replay_latency)
+    # route all upstream traffic through the cassette, installed once here as the session is shared by every request
+    http_client = install(cassette, get_session()) if cassette else None
+
+    weather_cache = None
+    if args.weather_cache_ttl > 0:
+        weather_cache = SpatialWeatherCache(precision=args.weather_cache_precision, ttl=args.weather_cache_ttl)
+
+    router = ModelRouter(
+        default_model=args.tool_model,
+        models={TOOL_SELECTION: args.tool_model, PHRASING: args.phrasing_model, ERROR: args.error_model},
+        escalation_model=args.escalation_model or None,
+    )
+
     convo_handler = ConversationHandler(
         weather_api_key=args.open_weather_api_key,
         bing_api_key=args.bing_api_key,
         openai_api_key=args.openai_api_key,
+        image_cache=image_cache,
+        image_timeout=args.image_timeout,
+        profiler=profiler,
+        http_client=http_client,
+        speculate=args.speculate,
+        weather_cache=weather_cache,
+        forecast_cache=ForecastCache(ttl=args.forecast_cache_ttl),
+        turn_timeout=args.turn_timeout,
+        key_strategy=args.key_strategy,
+        router=router,
+        image_library=ImageLibrary.load(args.image_library) if args.image_library else None,
+        bing_fallback=not args.no_bing_fallback,
+        # never warm up when the cassette replaces the upstreams
+        warmup=args.warmup and cassette is None,
+        keepalive_interval=args.keepalive_interval or None,
     )
 
     convo_handler.run()
@@ -20,21 +92,206 @@ def get_args():
 
     parser.add_argument(
         "--bing-api-key",
-        help="Bing Image Search API key",
+        help="Bing Image Search API key, comma separated for a pool of keys (optionally key:weight)",
         default=getenv("BING_API_KEY"),
     )
     parser.add_argument(
         "--openai-api-key",
-        help="OpenAI API key",
+        help="OpenAI API key, comma separated for a pool of keys (optionally key:weight)",
         default=getenv("OPENAI_API_KEY"),
     )
 
     parser.add_argument(
         "--open-weather-api-key",
-        help="Open Weather API key",
+        help="Open Weather API key, comma separated for a pool of keys (optionally key:weight)",
         default=getenv("OPEN_WEATHER_API_KEY"),
     )
 
+    parser.add_argument(
+        "--image-cache-dir",
+        help="Directory to cache image thumbnails in, disabled if not set",
+        default=getenv("IMAGE_CACHE_DIR"),
+    )
+    parser.add_argument(
+        "--image-cache-mb",
+        help="Max size of the image cache in MB",
+        type=int,
+        default=int(getenv("IMAGE_CACHE_MB", 50)),
+    )
+    parser.add_argument(
+        "--image-cache-base-url",
+        help="URL the image cache dir is served from, uses file:// urls if not set",
+        default=getenv("IMAGE_CACHE_BASE_URL"),
+    )
+
+    parser.add_argument(
+        "--image-timeout",
+        help="Seconds after the first image search starts before images that aren't ready are dropped",
+        type=float,
+        default=3.0,
+    )
+
+    parser.add_argument(
+        "--profile",
+        help="Profile turns with cProfile and dump them to --profile-dir",
+        action="store_true",
+        default=bool(getenv("WEATHER_BOT_PROFILE")),
+    )
+    parser.add_argument(
+        "--profile-dir",
+        help="Directory for the per-turn profile files",
+        default=getenv("WEATHER_BOT_PROFILE_DIR", "profiles"),
+    )
+    parser.add_argument(
+        "--profile-every",
+        help="Profile every Nth turn, defaults to every turn unless a threshold is set",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--profile-threshold-ms",
+        help="Only keep profiles of turns slower than this",
+        type=float,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--record",
+        help="Record all upstream exchanges to this cassette file (.jsonl or .jsonl.gz)",
+        default=None,
+    )
+    parser.add_argument(
+        "--replay",
+        help="Replay upstream exchanges from this cassette file instead of calling the APIs",
+        default=None,
+    )
+    parser.add_argument(
+        "--replay-latency",
+        help="Seconds to wait before returning each replayed response",
+        type=float,
+        default=0.0,
+    )
+
+    parser.add_argument(
+        "--speculate",
+        help="Look up the weather for locations in the input while the model picks the tool",
+        action="store_true",
+        default=bool(getenv("WEATHER_BOT_SPECULATE")),
+    )
+
+    parser.add_argument(
+        "--weather-cache-precision",
+        help="Geohash precision of the weather cache cells, 5 is roughly 5km",
+        type=int,
+        default=5,
+    )
+    parser.add_argument(
+        "--weather-cache-ttl",
+        help="Seconds a weather observation is reused for, 0 disables the cache",
+        type=float,
+        default=600,
+    )
+
+    parser.add_argument(
+        "--forecast-cache-ttl",
+        help="Seconds a fetched multi-day forecast is used to answer follow ups",
+        type=float,
+        default=1800,
+    )
+
+    parser.add_argument(
+        "--turn-timeout",
+        help="Seconds each turn has for all upstream calls before degrading the response",
+        type=float,
+        default=float(getenv("WEATHER_BOT_TURN_TIMEOUT", 20)),
+    )
+
+    parser.add_argument(
+        "--key-strategy",
+        help="How keys are picked from a pool",
+        choices=["weighted", "least_used"],
+        default="weighted",
+    )
+
+    parser.add_argument(
+        "--tool-model",
+        help="Model that picks the tools to call",
+        default="gpt-4o",
+    )
+    parser.add_argument(
+        "--phrasing-model",
+        help="Model that phrases the response from the tool results",
+        default="gpt-4o-mini",
+    )
+    parser.add_argument(
+        "--error-model",
+        help="Model that phrases the response when a tool fails",
+        default="gpt-4o-mini",
+    )
+    parser.add_argument(
+        "--escalation-model",
+        help="Model used for multi-city or ambiguous turns, empty to disable escalation",
+        default="gpt-4o",
+    )
+
+    parser.add_argument(
+        "--image-library",
+        help="Prebuilt condition to image library, see python -m function_calling_weather_bot.image_library",
+        default=getenv("IMAGE_LIBRARY"),
+    )
+    parser.add_argument(
+        "--no-bing-fallback",
+        help="Don't search Bing for conditions the image library doesn't cover",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--warmup",
+        help="Connect to the upstreams while waiting for the first input and keep the connections alive",
+        action="store_true",
+        default=bool(getenv("WEATHER_BOT_WARMUP")),
+    )
+    parser.add_argument(
+        "--keepalive-interval",
+        help="Seconds idle before warmed connections are pinged again, 0 to only warm at start",
+        type=float,
+        default=30.0,
+    )
+    parser.add_argument(
+        "--hedge",
+        help="Send a duplicate of slow weather and image requests and use the first response",
+        action="store_true",
+        default=bool(getenv("WEATHER_BOT_HEDGE")),
+    )
+    parser.add_argument(
+        "--hedge-delay",
+        help="Seconds before a request is duplicated, defaults to the live p95 latency of the endpoint",
+        type=float,
+        default=None,
+    )
+    parser.add_argument(
+        "--hedge-max-ratio",
+        help="Max share of requests that are duplicated",
+        type=float,
+        default=0.05,
+    )
+    parser.add_argument(
+        "--hedge-workers",
+        help="Threads running the weather and image requests while hedging is on",
+        type=int,
+        default=64,
+    )
+    parser.add_argument(
+        "--log-format",
+        help="rich for the terminal, jsonl for structured records written from a background thread",
+        choices=console.BACKENDS,
+        default=getenv("WEATHER_BOT_LOG_FORMAT", "rich"),
+    )
+    parser.add_argument(
+        "--log-file",
+        help="With --log-format jsonl, append the records to this file instead of stderr",
+        default=getenv("WEATHER_BOT_LOG_FILE"),
+    )
+
     args = parser.parse_args()
     return args
 
@@ -6,18 +6,18 @@ ICONS = {
     "02d": "⛅️",
     "03d": "☁️",
     "04d": "☁️",
-    "09d": "\ud83c\udf27",
-    "10d": "\ud83c\udf26",
+    "09d": "\U0001f327",
+    "10d": "\U0001f326",
     "11d": "⛈",
     "13d": "❄️",
-    "50d": "\ud83c\udf2b",
-    "01n": "\ud83c\udf11",
-    "02n": "\ud83c\udf11 ☁",
+    "50d": "\U0001f32b",
+    "01n": "\U0001f311",
+    "02n": "\U0001f311 ☁",
     "03n": "☁️",
     "04n": "️️☁☁",
-    "09n": "\ud83c\udf27",
+    "09n": "\U0001f327",
     "10n": "☔️",
     "11n": "⛈",
     "13n": "❄️",
-    "50n": "\ud83c\udf2b",
+    "50n": "\U0001f32b",
 }
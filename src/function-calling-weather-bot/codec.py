@@ -0,0 +1,230 @@
+import json
+from dataclasses import asdict, dataclass, field, is_dataclass
+from typing import Any
+
+# optional fast json libraries, msgspec can also decode straight into the typed responses below
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKENDS = ("msgspec", "orjson", "json")
+
+
+@dataclass
+class OpenWeatherCondition:
+    description: str
+    icon: str
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "OpenWeatherCondition":
+        return cls(description=data["description"], icon=data["icon"])
+
+
+@dataclass
+class OpenWeatherMain:
+    temp: float
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "OpenWeatherMain":
+        return cls(temp=data["temp"])
+
+
+@dataclass
+class OpenWeatherSys:
+    country: str = ""
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "OpenWeatherSys":
+        return cls(country=data.get("country", ""))
+
+
+@dataclass
+class OpenWeatherCoord:
+    lat: float
+    lon: float
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "OpenWeatherCoord":
+        return cls(lat=data["lat"], lon=data["lon"])
+
+
+@dataclass
+class OpenWeatherResponse:
+    """The subset of the OpenWeather current weather response that we use."""
+
+    cod: int | str
+    name: str
+    weather: list[OpenWeatherCondition]
+    main: OpenWeatherMain
+    sys: OpenWeatherSys
+    coord: OpenWeatherCoord | None = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "OpenWeatherResponse":
+        return cls(
+            cod=data["cod"],
+            name=data["name"],
+            weather=[OpenWeatherCondition.from_dict(w) for w in data["weather"]],
+            main=OpenWeatherMain.from_dict(data["main"]),
+            sys=OpenWeatherSys.from_dict(data.get("sys", {})),
+            coord=OpenWeatherCoord.from_dict(data["coord"]) if "coord" in data else None,
+        )
+
+
+@dataclass
+class OpenWeatherForecastEntry:
+    dt: int
+    main: OpenWeatherMain
+    weather: list[OpenWeatherCondition]
+    pop: float = 0.0
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "OpenWeatherForecastEntry":
+        return cls(
+            dt=data["dt"],
+            main=OpenWeatherMain.from_dict(data["main"]),
+            weather=[OpenWeatherCondition.from_dict(w) for w in data["weather"]],
+            pop=data.get("pop", 0.0),
+        )
+
+
+@dataclass
+class OpenWeatherForecastCity:
+    name: str
+    country: str = ""
+    timezone: int = 0
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "OpenWeatherForecastCity":
+        return cls(name=data["name"], country=data.get("country", ""), timezone=data.get("timezone", 0))
+
+
+@dataclass
+class OpenWeatherForecastResponse:
+    """The subset of the OpenWeather 5 day / 3 hour forecast response that we use."""
+
+    cod: int | str
+    list: list[OpenWeatherForecastEntry]
+    city: OpenWeatherForecastCity
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "OpenWeatherForecastResponse":
+        return cls(
+            cod=data["cod"],
+            list=[OpenWeatherForecastEntry.from_dict(entry) for entry in data["list"]],
+            city=OpenWeatherForecastCity.from_dict(data["city"]),
+        )
+
+
+@dataclass
+class BingImage:
+    contentUrl: str | None = None
+    thumbnailUrl: str | None = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "BingImage":
+        return cls(contentUrl=data.get("contentUrl"), thumbnailUrl=data.get("thumbnailUrl"))
+
+
+@dataclass
+class BingImageResponse:
+    """The subset of the Bing image search response that we use."""
+
+    value: list[BingImage] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "BingImageResponse":
+        return cls(value=[BingImage.from_dict(v) for v in data.get("value", [])])
+
+
+def _default_backend() -> str:
+    if msgspec is not None:
+        return "msgspec"
+    if orjson is not None:
+        return "orjson"
+    return "json"
+
+
+_backend = _default_backend()
+
+
+def get_backend() -> str:
+    return _backend
+
+
+def set_backend(name: str) -> None:
+    """
+    Select the json library, mostly for benchmarking and testing the fallbacks.
+
+    Args:
+        name: One of "msgspec", "orjson" or "json".
+
+    Raises:
+        ValueError: If the backend is unknown or not installed.
+    """
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown json backend: {name}")
+    if (name == "msgspec" and msgspec is None) or (name == "orjson" and orjson is None):
+        raise ValueError(f"JSON backend {name} is not installed")
+    _backend = name
+
+
+def loads(data: bytes | str) -> Any:
+    """
+    Decode json into python objects.
+
+    Args:
+        data: The json bytes or string.
+
+    Returns:
+        The decoded object.
+    """
+    if _backend == "orjson":
+        return orjson.loads(data)
+    if _backend == "msgspec":
+        return msgspec.json.decode(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> str:
+    """
+    Encode an object, including dataclasses like WeatherData, as a json string.
+
+    Args:
+        obj: The object to encode.
+
+    Returns:
+        The json string.
+    """
+    if _backend == "orjson":
+        return orjson.dumps(obj).decode()
+    if _backend == "msgspec":
+        return msgspec.json.encode(obj).decode()
+    if is_dataclass(obj):
+        obj = asdict(obj)
+    return json.dumps(obj)
+
+
+def decode(data: bytes | str, type_: type) -> Any:
+    """
+    Decode json into one of the typed responses above.
+
+    With msgspec this skips building the intermediate dict, otherwise uses `type_.from_dict`.
+
+    Args:
+        data: The json bytes or string.
+        type_: The response dataclass e.g. OpenWeatherResponse.
+
+    Returns:
+        An instance of `type_`.
+    """
+    if _backend == "msgspec":
+        return msgspec.json.decode(data, type=type_)
+    return type_.from_dict(loads(data))
@@ -1,6 +1,14 @@
 import atexit
+import contextvars
 import functools
+import json
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
 from enum import StrEnum, auto
+from typing import TextIO
 
 from rich.console import Console
 from rich.progress import MofNCompleteColumn, Progress, TimeElapsedColumn
@@ -26,16 +34,100 @@ class LogLevel(StrEnum):
         Returns:
             True if the log level is less than or equal to the other log level.
         """
-        levels = list(LogLevel)
-        return levels.index(self) <= levels.index(other)
+        return _RANK[self] <= _RANK[other]
 
 
+# Position of each level, computed once instead of on every comparison.
+_RANK = {level: rank for rank, level in enumerate(LogLevel)}
+
 # Console for pretty printing.
 _console = Console()
 
 # The current log level.
 LEVEL = LogLevel.INFO
 
+# Whether each level is logged at the current log level, updated by setLEVEL.
+_enabled = {level: LEVEL <= level for level in LogLevel}
+
+# The output backends, "rich" renders on the calling thread, "jsonl" hands records to a writer thread.
+BACKENDS = ("rich", "jsonl")
+
+# The trace id of the current turn, added to structured records.
+_trace_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("trace_id", default=None)
+
+# Tells the writer thread to stop.
+_CLOSE = object()
+
+
+class JsonLinesWriter:
+    """Writes log records as json lines from a background thread.
+
+    Logging only puts the record on a bounded queue, if the writer falls behind records are
+    dropped and counted rather than blocking the caller.
+
+    Args:
+        stream: Where to write the records, stderr by default.
+        max_queue: Max records waiting to be written.
+        batch_size: Max records written per flush.
+    """
+
+    def __init__(self, stream: TextIO = None, max_queue: int = 10000, batch_size: int = 256):
+        self.stream = stream or sys.stderr
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._reported_dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, level: LogLevel, msg: str) -> None:
+        """Queue a record, never blocks.
+
+        Args:
+            level: The log level.
+            msg: The message, rich markup is kept as is.
+        """
+        record = {"ts": time.time(), "level": str(level), "msg": str(msg)}
+        if (trace_id := _trace_id.get()) is not None:
+            record["trace_id"] = trace_id
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            records = [record for record in batch if record is not _CLOSE]
+            if self.dropped != self._reported_dropped:
+                msg = f"Dropped {self.dropped - self._reported_dropped} log records"
+                records.append({"ts": time.time(), "level": str(LogLevel.WARNING), "msg": msg})
+                self._reported_dropped = self.dropped
+            if records:
+                self.stream.write("".join(json.dumps(record) + "\n" for record in records))
+                self.stream.flush()
+            if len(records) < len(batch):
+                return
+
+    def close(self, timeout: float = 5.0):
+        """Write the queued records and stop the writer thread.
+
+        Args:
+            timeout: Seconds to wait for the queued records to be written.
+        """
+        self._queue.put(_CLOSE)
+        self._thread.join(timeout)
+
+
+# The writer of the "jsonl" backend, None for "rich".
+_writer: JsonLinesWriter | None = None
+
 
 def get_console():
     """helper but not sure if it is useful as can just use _console
@@ -54,11 +146,77 @@ def setLEVEL(log_level: LogLevel):
     """
     global LEVEL
     LEVEL = log_level
+    _enabled.update({level: LEVEL <= level for level in LogLevel})
+
+
+def set_backend(backend: str, stream: TextIO = None):
+    """Select where log messages go.
+
+    "rich" (the default) renders them on the terminal, which suits the interactive `run`.
+    "jsonl" writes one json record per message with the level, time and trace id of the turn
+    from a background thread, for server and batch use.
+
+    Args:
+        backend: One of BACKENDS.
+        stream: Where the "jsonl" backend writes, stderr by default.
+    """
+    global _writer
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown log backend: {backend}, expected one of {BACKENDS}")
+
+    if _writer is not None:
+        _writer.close()
+        _writer = None
+    if backend == "jsonl":
+        _writer = JsonLinesWriter(stream)
+
+
+def get_backend() -> str:
+    """The current log backend."""
+    return "rich" if _writer is None else "jsonl"
+
+
+@atexit.register
+def _close_writer():
+    if _writer is not None:
+        _writer.close()
+
+
+@contextmanager
+def trace(trace_id: str):
+    """Tags the messages logged inside the block with `trace_id`.
+
+    Args:
+        trace_id: The trace id e.g. of the current turn.
+    """
+    token = _trace_id.set(trace_id)
+    try:
+        yield trace_id
+    finally:
+        _trace_id.reset(token)
+
+
+def _log(level: LogLevel, msg: str, styled: str, _stack_offset: int, **kwargs):
+    # the rich console inspects the caller's frame and renders on this thread, the writer does neither
+    if _writer is not None:
+        _writer.write(level, msg)
+    else:
+        _console.log(styled, _stack_offset=_stack_offset, **kwargs)
 
 
 def print(msg: str, _stack_offset: int = 2, **kwargs):
     """Print a message.
 
+    Args:
+        msg: The message to print.
+        kwargs: Keyword arguments to pass to the print function.
+    """
+    _log(LogLevel.INFO, msg, msg, _stack_offset=_stack_offset + 1, **kwargs)
+
+
+def say(msg: str, _stack_offset: int = 2, **kwargs):
+    """Print a message for the user, on the terminal whatever the backend.
+
     Args:
         msg: The message to print.
         kwargs: Keyword arguments to pass to the print function.
@@ -73,8 +231,8 @@ def debug(msg: str, **kwargs):
         msg: The debug message.
         kwargs: Keyword arguments to pass to the print function.
     """
-    if LEVEL <= LogLevel.DEBUG:
-        print(f"[blue]Debug: {msg}[/blue]", **kwargs)
+    if _enabled[LogLevel.DEBUG]:
+        _log(LogLevel.DEBUG, msg, f"[blue]Debug: {msg}[/blue]", _stack_offset=2, **kwargs)
 
 
 def info(msg: str, _stack_offset: int = 3, **kwargs):
@@ -84,8 +242,8 @@ def info(msg: str, _stack_offset: int = 3, **kwargs):
         msg: The info message.
         kwargs: Keyword arguments to pass to the print function.
     """
-    if LEVEL <= LogLevel.INFO:
-        print(f"[cyan]Info: {msg}[/cyan]", _stack_offset=_stack_offset, **kwargs)
+    if _enabled[LogLevel.INFO]:
+        _log(LogLevel.INFO, msg, f"[cyan]Info: {msg}[/cyan]", _stack_offset=_stack_offset, **kwargs)
 
 
 def success(msg: str, **kwargs):
@@ -95,8 +253,8 @@ def success(msg: str, **kwargs):
         msg: The success message.
         kwargs: Keyword arguments to pass to the print function.
     """
-    if LEVEL <= LogLevel.INFO:
-        print(f"[green]Success: {msg}[/green]", **kwargs)
+    if _enabled[LogLevel.INFO]:
+        _log(LogLevel.INFO, msg, f"[green]Success: {msg}[/green]", _stack_offset=2, **kwargs)
 
 
 def log(msg: str, _stack_offset: int = 2, **kwargs):
@@ -106,8 +264,8 @@ def log(msg: str, _stack_offset: int = 2, **kwargs):
         msg: The message to log.
         kwargs: Keyword arguments to pass to the print function.
     """
-    if LEVEL <= LogLevel.INFO:
-        _console.log(msg, _stack_offset=_stack_offset, **kwargs)
+    if _enabled[LogLevel.INFO]:
+        _log(LogLevel.INFO, msg, msg, _stack_offset=_stack_offset + 1, **kwargs)
 
 
 def rule(**kwargs):
@@ -127,8 +285,8 @@ def warn(msg: str, _stack_offset: int = 3, **kwargs):
         msg: The warning message.
         kwargs: Keyword arguments to pass to the print function.
     """
-    if LEVEL <= LogLevel.WARNING:
-        print(f"[orange1]Warning: {msg}[/orange1]", _stack_offset=_stack_offset, **kwargs)
+    if _enabled[LogLevel.WARNING]:
+        _log(LogLevel.WARNING, msg, f"[orange1]Warning: {msg}[/orange1]", _stack_offset=_stack_offset, **kwargs)
 
 
 @functools.cache
@@ -165,8 +323,8 @@ def deprecate(
         f"{feature_name} has been deprecated in version {deprecation_version} {reason.rstrip('.')}. It will be completely "
         f"removed in {removal_version}"
     )
-    if LEVEL <= LogLevel.WARNING:
-        print(f"[yellow]DeprecationWarning: {msg}[/yellow]", **kwargs)
+    if _enabled[LogLevel.WARNING]:
+        _log(LogLevel.WARNING, msg, f"[yellow]DeprecationWarning: {msg}[/yellow]", _stack_offset=2, **kwargs)
 
 
 def error(msg: str, _stack_offset: int = 3, **kwargs):
@@ -176,8 +334,8 @@ def error(msg: str, _stack_offset: int = 3, **kwargs):
         msg: The error message.
         kwargs: Keyword arguments to pass to the print function.
     """
-    if LEVEL <= LogLevel.ERROR:
-        print(f"[red]{msg}[/red]", _stack_offset=_stack_offset, **kwargs)
+    if _enabled[LogLevel.ERROR]:
+        _log(LogLevel.ERROR, msg, f"[red]{msg}[/red]", _stack_offset=_stack_offset, **kwargs)
 
 
 def check_or_fail(condition: bool, msg: str = "Check failed", _stack_offset: int = 3, **kwargs):
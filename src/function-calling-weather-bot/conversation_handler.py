@@ -1,17 +1,61 @@
-import json
 import random
-from dataclasses import asdict
-
-from openai import OpenAI
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager, nullcontext
+
+import httpx
+import openai
+import requests
+from openai import NOT_GIVEN, DefaultHttpxClient, OpenAI
 from openai.types.chat.chat_completion import ChatCompletion
 from openai.types.chat.chat_completion_message_tool_call import ChatCompletionMessageToolCall
 
-from function_calling_weather_bot import console
+from function_calling_weather_bot import codec, console, deadline, metrics
+from function_calling_weather_bot.forecast import ForecastCache
+from function_calling_weather_bot.image_cache import ImageCache
+from function_calling_weather_bot.image_library import ImageLibrary
+from function_calling_weather_bot.keypool import KeyPool, KeyPoolExhausted
+from function_calling_weather_bot.profiling import TurnProfiler
+from function_calling_weather_bot.routing import ERROR, PHRASING, TOOL_SELECTION, ModelRouter
 from function_calling_weather_bot.services import Services, WeatherData
-from function_calling_weather_bot.utils import retry, Tool
+from function_calling_weather_bot.speculation import Speculation, WeatherSpeculator
+from function_calling_weather_bot.utils import get_session, retry, Tool
+from function_calling_weather_bot.services_spec import BASE_BING_API, BASE_WEATHER_API
+from function_calling_weather_bot.warmup import Warmer
+from function_calling_weather_bot.weather_cache import SpatialWeatherCache
 
 CONVO_END = ["exit", "quit", "stop"]
 
+# errors that mean the turn ran out of time, these degrade the response instead of failing the turn
+TIMEOUT_ERRORS = (deadline.DeadlineExceeded, requests.Timeout, openai.APITimeoutError)
+
+# errors that mean the llm can't be used right now, these degrade the response the same way
+UNAVAILABLE_ERRORS = TIMEOUT_ERRORS + (KeyPoolExhausted, openai.RateLimitError)
+
+APOLOGY = "Sorry, I couldn't get that in time. Please try again in a moment."
+
+# countries using fahrenheit, templated responses use celsius everywhere else
+FAHRENHEIT_COUNTRIES = {"US", "LR", "MM", "BS", "BZ", "KY", "PW"}
+
+
+def format_temperature(kelvin: float, country_code: str = None) -> str:
+    """
+    Formats a temperature from OpenWeather, which is in Kelvin, in the unit used in the country.
+
+    Args:
+        kelvin (float): The temperature in Kelvin.
+        country_code (str, optional): The country of the observation.
+
+    Returns:
+        str: The rounded temperature with its unit, e.g. "18°C".
+    """
+    celsius = kelvin - 273.15
+    if country_code in FAHRENHEIT_COUNTRIES:
+        return f"{celsius * 9 / 5 + 32:.0f}°F"
+    return f"{celsius:.0f}°C"
+
 
 BASE_MESSAGE = {
     "role": "system",
@@ -29,10 +73,26 @@ def craft_system_response(tool_response):
 
 
 class LLMHandler:
-    def __init__(self, api_key: str, model_id: str = "gpt-4o"):
-        self._api_key = api_key
-        self.client = OpenAI(api_key=api_key)
+    def __init__(
+        self,
+        api_key: str | list[str] | KeyPool,
+        model_id: str = "gpt-4o",
+        http_client: httpx.Client = None,
+        key_strategy: str = "weighted",
+        router: ModelRouter = None,
+    ):
+        if not api_key:
+            raise ValueError("OpenAI API key is required. Use kwarg or set OPENAI_API_KEY")
+        self.keys = KeyPool.from_keys(api_key, name="openai", strategy=key_strategy)
+        # the clients share one connection pool so a warmed up connection is used whichever key is picked
+        self.http_client = http_client or DefaultHttpxClient()
+        # one client per key, retries are done by @retry which stops at the turn deadline, the client's own would not
+        self.clients = {
+            key: OpenAI(api_key=key, http_client=self.http_client, max_retries=0) for key in self.keys.keys
+        }
+        self.client = self.clients[self.keys.keys[0]]
         self.model_id = model_id
+        self.router = router or ModelRouter(default_model=model_id)
         self.messages = [BASE_MESSAGE]
 
     def add_assistant_message(self, content: str) -> None:
@@ -50,23 +110,20 @@ class LLMHandler:
     def add_tool_call_to_messages(
         self,
         tool_call: ChatCompletionMessageToolCall,
-        tool_response: dict | str,
+        tool_response: object,
     ) -> None:
         """
         Adds a tool call and its response to the list of messages.
 
         Args:
             tool_call (ToolCall): The tool call object.
-            tool_response (dict | str): The response from the tool call.
+            tool_response (WeatherData | ForecastData | dict | str): The response from the tool call.
 
         Returns:
             None
         """
-        if isinstance(tool_response, WeatherData):
-            tool_response = asdict(tool_response)
-
-        if isinstance(tool_response, dict):
-            tool_response = json.dumps(tool_response)
+        if not isinstance(tool_response, str):
+            tool_response = codec.dumps(tool_response)
         self.messages.append(
             {
                 "tool_call_id": tool_call.id,
@@ -89,23 +146,36 @@ class LLMHandler:
         self.messages.append({"role": "user", "content": user_input})
 
     @retry(max_retries=3)
-    def get_response_with_tool(self, messages: list[dict] = None) -> ChatCompletion:
+    def get_response_with_tool(
+        self,
+        messages: list[dict] = None,
+        stage: str = TOOL_SELECTION,
+        escalate: bool = False,
+        tool_choice: str = "auto",
+    ) -> ChatCompletion:
         """
         Retrieves a response using the chat completion API trying to use tools.
 
+        Args:
+            messages (list[dict], optional): The messages, defaults to the stored messages.
+            stage (str): The stage of the turn, picks the model via the router.
+            escalate (bool): Use the router's escalation model.
+            tool_choice (str): "auto" to let the model call tools, "none" for a text answer only.
+
         Returns:
             ChatCompletion: The response generated by the chat completion API.
         """
-        response = self.client.chat.completions.create(
-            model=self.model_id,
+        response = self._create(
+            stage,
+            escalate,
             messages=messages or self.messages,
             tools=Tool.get_all_specs(),
-            tool_choice="auto",
+            tool_choice=tool_choice,
         )
         return response
 
     @retry(max_retries=3)
-    def individual_response(self, messages: list[dict] = None) -> ChatCompletion:
+    def individual_response(self, messages: list[dict] = None, stage: str = ERROR) -> ChatCompletion:
         """
         Generates an individual response using the OpenAI Chat API.
 
@@ -113,16 +183,34 @@ class LLMHandler:
             messages (list[dict], optional): A list of message objects representing the conversation.
                 Each message object should have a 'role' ('system', 'user', or 'assistant') and 'content' (the message content).
                 Defaults to None, in which case the method uses the stored messages.
+            stage (str): The stage of the turn, picks the model via the router.
 
         Returns:
             ChatCompletion: The generated response from the Chat API.
         """
-        response = self.client.chat.completions.create(
-            model=self.model_id,
+        response = self._create(
+            stage,
+            False,
             messages=messages or self.messages,
         )
         return response
 
+    def _create(self, stage: str, escalate: bool, **kwargs) -> ChatCompletion:
+        model = self.router.model_for(stage, escalate)
+        start = time.perf_counter()
+        # picks the client for the next key in the pool, rate limited keys are skipped
+        response = self.keys.call(
+            lambda key: self.clients[key].chat.completions.create(
+                model=model, timeout=deadline.timeout(NOT_GIVEN), **kwargs
+            )
+        )
+
+        metrics.observe(f"llm.{stage}.{model}.latency_ms", (time.perf_counter() - start) * 1000)
+        if usage := getattr(response, "usage", None):
+            metrics.incr(f"llm.{stage}.{model}.prompt_tokens", usage.prompt_tokens)
+            metrics.incr(f"llm.{stage}.{model}.completion_tokens", usage.completion_tokens)
+        return response
+
 
 class ConversationHandler:
     def __init__(
@@ -130,14 +218,80 @@ class ConversationHandler:
         weather_api_key: str = None,
         openai_api_key: str = None,
         bing_api_key: str = None,
+        image_cache: ImageCache = None,
+        image_cache_timeout: float = 2.0,
+        image_timeout: float = 3.0,
+        profiler: TurnProfiler = None,
+        http_client: httpx.Client = None,
+        speculate: bool = False,
+        weather_cache: SpatialWeatherCache = None,
+        forecast_cache: ForecastCache = None,
+        turn_timeout: float = None,
+        key_strategy: str = "weighted",
+        router: ModelRouter = None,
+        image_library: ImageLibrary = None,
+        bing_fallback: bool = True,
+        warmup: bool = False,
+        keepalive_interval: float | None = 30.0,
     ):
         # initialize external apis
         self.weather_api_key = weather_api_key
         self.openai_api_key = openai_api_key
         self.bing_api_key = bing_api_key
         self.random_image = True
-        self.services = Services(weather_api_key=weather_api_key, bing_api_key=bing_api_key)
-        self.llm_handler = LLMHandler(openai_api_key)
+        # optional, images picked locally by condition with image search only as a fallback
+        self.image_library = image_library
+        self.bing_fallback = bing_fallback
+        # optional, if set thumbnails are served from the local cache instead of the remote host
+        self.image_cache = image_cache
+        self.image_cache_timeout = image_cache_timeout
+        self.max_image_candidates = 5
+        # image searches run alongside the final completion and are dropped if not done in time
+        self.image_timeout = image_timeout
+        self._image_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="image-search")
+        self.profiler = profiler
+        # seconds each turn has for all upstream calls, None for no deadline
+        self.turn_timeout = turn_timeout
+        self.trace_id = None
+        self._in_turn = False
+        self.services = Services(
+            weather_api_key=weather_api_key,
+            bing_api_key=bing_api_key,
+            weather_cache=weather_cache,
+            forecast_cache=forecast_cache,
+            key_strategy=key_strategy,
+        )
+
+        # optional, e.g. the cassette client from transport.install when recording or replaying
+        self.llm_handler = LLMHandler(
+            openai_api_key,
+            http_client=http_client,
+            key_strategy=key_strategy,
+            router=router,
+        )
+
+        # optionally connect to the upstreams while waiting for the first input
+        self.warmer = None
+        if warmup:
+            self.warmer = Warmer(self._warmup_targets(), keepalive_interval=keepalive_interval)
+
+        # optionally look up the weather for the locations in the input while the model picks the tool
+        self.speculator = None
+        if speculate:
+            self.speculator = WeatherSpeculator(
+                lambda city_name: self.services.weather_funcs["get_weather_from_city_name"](city_name=city_name)
+            )
+
+    def _warmup_targets(self) -> dict[str, callable]:
+        """The upstreams to connect to ahead of the first turn, through the pools used by the real calls."""
+        session = get_session()
+        targets = {
+            "openai": lambda: self.llm_handler.http_client.head(str(self.llm_handler.client.base_url), timeout=5),
+            "openweather": lambda: session.head(BASE_WEATHER_API, timeout=5),
+        }
+        if self.bing_api_key and (self.image_library is None or self.bing_fallback):
+            targets["bing"] = lambda: session.head(BASE_BING_API, timeout=5)
+        return targets
 
     def _error_with_tool(self, tool_call: ChatCompletionMessageToolCall) -> str:
         """
@@ -153,31 +307,124 @@ class ConversationHandler:
         message_content = f"Couldn't get the weather for that location using {tool_call.function.name}."
         messages = [{"role": "system", "content": message_content}]
 
-        system_response = self.llm_handler.individual_response(messages)
+        try:
+            system_response = self.llm_handler.individual_response(messages, stage=ERROR)
+        except UNAVAILABLE_ERRORS:
+            return self._degrade("error_templated", "Sorry, I couldn't get the weather for that location.")
+
         content = system_response.choices[0].message.content
         self.llm_handler.add_assistant_message(content)
         return content
 
-    def get_image_for_weather(self, weather_data: WeatherData) -> str:
+    def _degrade(self, kind: str, content: str) -> str:
+        """
+        Responds with `content` instead of a generated response and records the degradation.
+
+        Args:
+            kind (str): What was degraded, used in the metric name.
+            content (str): The response to use.
+
+        Returns:
+            str: The content.
+        """
+        console.warn(f"Degraded response ({kind}) for turn {self.trace_id}")
+        metrics.incr(f"degraded.{kind}")
+        self.llm_handler.add_assistant_message(content)
+        return content
+
+    @staticmethod
+    def _describe(tool_response) -> str | None:
+        # templated text for when there is no time left for the model to phrase the response
+        if isinstance(tool_response, WeatherData):
+            return (
+                f"{tool_response.icon} It's currently {tool_response.description} and "
+                f"{format_temperature(tool_response.temperature, tool_response.country_code)} "
+                f"in {tool_response.location}, {tool_response.country_code}."
+            ).strip()
+        return None
+
+    def get_image_for_weather(self, weather_data: WeatherData) -> str | None:
         """
         Retrieves an image URL for the given weather data.
 
+        Uses the image library if the condition is covered, otherwise searches for an image
+        unless `bing_fallback` is off.
+
         Args:
             weather_data (WeatherData): The weather data object containing information about the weather.
 
         Returns:
-            str: The URL of the image representing the weather.
+            str | None: The URL of the image representing the weather, None if there is none.
         """
+        if self.image_library is not None:
+            if image := self.image_library.select(weather_data.icon_code, weather_data.country_code):
+                return image
+            if not self.bing_fallback:
+                return None
+
         query = f"{weather_data.description} in {weather_data.location}, {weather_data.country_code}"
         try:
             image_response = self.services.bing_funcs["get_weather_image"](query=query)
             images = image_response["images"]
-            image = random.choice(images) if self.random_image else image_response[0]
+            image = random.choice(images) if self.random_image else images[0]
+            if self.image_cache is not None:
+                return self._get_cached_image(image, images)
             image = image.get("image_url", image.get("thumbnail_url"))
-        except Exception:
-            image = "Error getting the image."
+        except Exception as err:
+            # a failed or timed out search drops the image, the response doesn't need it
+            console.debug(f"Dropping image, search failed: {err}")
+            metrics.incr("degraded.image_dropped")
+            return None
         return image
 
+    def _get_cached_image(self, image: dict, images: list[dict]) -> str:
+        """
+        Prefetches the thumbnail for the chosen image into the local cache and returns the local URL.
+
+        Falls back to the other thumbnails if the chosen one is dead, and to the remote URL if
+        nothing could be cached within `image_cache_timeout`.
+
+        Args:
+            image (dict): The chosen image.
+            images (list[dict]): All images returned from the search.
+
+        Returns:
+            str: The local URL of the cached thumbnail or the remote URL of the chosen image.
+        """
+        candidates = [image] + [other for other in images if other is not image]
+        thumbnail_urls = [c["thumbnail_url"] for c in candidates[: self.max_image_candidates] if c["thumbnail_url"]]
+
+        future = self.image_cache.prefetch(thumbnail_urls)
+        try:
+            if local_url := future.result(timeout=self.image_cache_timeout):
+                return local_url
+        except FutureTimeoutError:
+            console.debug("Timed out caching image, using remote url")
+        return image["image_url"] or image["thumbnail_url"]
+
+    @contextmanager
+    def turn(self):
+        """
+        Context manager for a single conversation turn.
+
+        Assigns a new trace id, added to structured log records, and if a profiler is set runs the turn under it.
+        Nested calls reuse the outer turn so `run` can include rendering the response.
+        """
+        if self._in_turn:
+            yield self.trace_id
+            return
+
+        self._in_turn = True
+        self.trace_id = uuid.uuid4().hex[:12]
+        profile_ctx = self.profiler.profile_turn(self.trace_id) if self.profiler else nullcontext()
+        try:
+            with console.trace(self.trace_id), profile_ctx:
+                yield self.trace_id
+        finally:
+            self._in_turn = False
+            if self.warmer:
+                self.warmer.touch()
+
     def process_input(self, user_input: str) -> str:
         """
         Processes the user input and generates a response.
@@ -188,38 +435,111 @@ class ConversationHandler:
         Returns:
             str: The generated response.
         """
-        self.llm_handler.add_user_input(user_input)
-        response: ChatCompletion = self.llm_handler.get_response_with_tool()
-
-        append_after = []
-        if tool_calls := response.choices[0].message.tool_calls:
-            # need to add this message no matter what if using tools and crafting the response
-            self.llm_handler.messages.append(response.choices[0].message)
-            for tool_call in tool_calls:
-                tool_kwargs = json.loads(tool_call.function.arguments)
-                try:
-                    tool_response = self.services.weather_funcs[tool_call.function.name](**tool_kwargs)
-                except Exception:
-                    return self._error_with_tool(tool_call)
-
-                # add the tool call to messages and then these are combined at end
-                self.llm_handler.add_tool_call_to_messages(tool_call, tool_response)
+        with self.turn(), deadline.deadline(self.turn_timeout):
+            return self._process_input(user_input)
 
-                if isinstance(tool_response, WeatherData):
-                    image_url = self.get_image_for_weather(tool_response)
-                    append_after.append(image_url)
+    def _process_input(self, user_input: str) -> str:
+        speculation = self.speculator.speculate(user_input) if self.speculator else Speculation()
+        with speculation:
+            return self._respond(user_input, speculation)
 
-        # this is similar to second response in their example
-        response: ChatCompletion = self.llm_handler.get_response_with_tool()
-        content = response.choices[0].message.content
-        self.llm_handler.add_assistant_message(content)
+    def _respond(self, user_input: str, speculation: Speculation) -> str:
+        self.llm_handler.add_user_input(user_input)
+        router = self.llm_handler.router
+        try:
+            response: ChatCompletion = self.llm_handler.get_response_with_tool(
+                stage=TOOL_SELECTION, escalate=router.should_escalate(TOOL_SELECTION, user_input=user_input)
+            )
+        except UNAVAILABLE_ERRORS:
+            return self._degrade("apology", APOLOGY)
+
+        message = response.choices[0].message
+        if not (tool_calls := message.tool_calls):
+            # answered without tools, asking the phrasing model again would only pay for a second answer
+            if message.content is None:
+                return self._degrade("apology", APOLOGY)
+            self.llm_handler.add_assistant_message(message.content)
+            return message.content
+
+        image_futures: list[Future] = []
+        images_started = None
+        tool_responses = []
+        # need to add this message no matter what if using tools and crafting the response
+        history_len = len(self.llm_handler.messages)
+        self.llm_handler.messages.append(message)
+        for tool_call in tool_calls:
+            tool_kwargs = codec.loads(tool_call.function.arguments)
+            try:
+                tool_response = speculation.claim(tool_call.function.name, tool_kwargs)
+                if tool_response is None:
+                    tool_response = self.services.weather_funcs[tool_call.function.name](**tool_kwargs)
+            except Exception:
+                self._cancel(image_futures)
+                # the api rejects tool calls without a tool message after them, drop the unfinished exchange
+                del self.llm_handler.messages[history_len:]
+                return self._error_with_tool(tool_call)
+
+            # add the tool call to messages and then these are combined at end
+            self.llm_handler.add_tool_call_to_messages(tool_call, tool_response)
+            tool_responses.append(tool_response)
+
+            # start the image search now so it overlaps with the next tool calls and the final completion
+            if isinstance(tool_response, WeatherData):
+                images_started = images_started or time.monotonic()
+                image_futures.append(deadline.submit(self._image_executor, self.get_image_for_weather, tool_response))
+
+        # this is similar to second response in their example, the tools already ran so only text is wanted
+        try:
+            response: ChatCompletion = self.llm_handler.get_response_with_tool(
+                stage=PHRASING,
+                escalate=router.should_escalate(PHRASING, tool_calls=tool_calls),
+                tool_choice="none",
+            )
+            content = response.choices[0].message.content
+        except UNAVAILABLE_ERRORS:
+            content = None
+
+        if content is not None:
+            self.llm_handler.add_assistant_message(content)
+        elif descriptions := [d for d in map(self._describe, tool_responses) if d]:
+            content = self._degrade("templated_response", " ".join(descriptions))
+        else:
+            content = self._degrade("apology", APOLOGY)
 
         # add the images after, allowing multiple images if multiple tool calls.
-        # could potentially combine the image getting and the tool call into one function
-        for image_url in append_after:
+        for image_url in self._join_images(image_futures, images_started):
             content += f"\n {image_url}"
         return content
 
+    def _join_images(self, image_futures: list[Future], started: float | None) -> list[str]:
+        """
+        Waits for the image searches until `image_timeout` after the first one started.
+
+        Args:
+            image_futures (list[Future]): The pending image searches in tool call order.
+            started (float | None): The monotonic time the first search was started.
+
+        Returns:
+            list[str]: The image urls of the searches that finished in time with an image, in order.
+        """
+        if not image_futures:
+            return []
+
+        remaining = max(0.0, self.image_timeout - (time.monotonic() - started))
+        if turn_deadline := deadline.current():
+            remaining = min(remaining, turn_deadline.remaining())
+        done, not_done = wait(image_futures, timeout=remaining)
+        if not_done:
+            console.debug(f"Dropping {len(not_done)} image(s) that did not finish in time")
+            metrics.incr("degraded.image_dropped", len(not_done))
+            self._cancel(not_done)
+        return [future.result() for future in image_futures if future in done and future.result()]
+
+    @staticmethod
+    def _cancel(futures) -> None:
+        for future in futures:
+            future.cancel()
+
     def run(self):
         """
         Runs the conversation loop.
@@ -232,12 +552,19 @@ class ConversationHandler:
             None
         """
         console.info(f"Conversation started. Type {CONVO_END} to stop.")
+        if self.warmer:
+            self.warmer.start()
 
         while True:
             user_input = console.ask("[magenta]You[/magenta] ")
             if user_input.lower() in CONVO_END:
                 console.info("Conversation ended")
+                if self.speculator:
+                    console.info(f"Speculation hit rate: {self.speculator.hit_rate:.0%}")
+                if self.warmer:
+                    self.warmer.stop()
                 break
 
-            response = self.process_input(user_input)
-            console.print(f"Bot: {response}")
+            with self.turn():
+                response = self.process_input(user_input)
+                console.say(f"Bot: {response}")
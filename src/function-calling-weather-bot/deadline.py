@@ -0,0 +1,90 @@
+import contextvars
+import time
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+
+from function_calling_weather_bot.profiling import run_profiled
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a call is about to start after the turn's deadline has passed."""
+
+
+class Deadline:
+    """
+    A point in time by which the current turn has to be done.
+
+    Args:
+        seconds (float): Seconds from now until the deadline.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def timeout(self, cap: float = None) -> float:
+        """
+        The timeout to use for a call made now, at most `cap`.
+
+        Raises:
+            DeadlineExceeded: If the deadline has already passed.
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Turn deadline of {self.seconds}s exceeded")
+        return min(remaining, cap) if cap is not None else remaining
+
+
+_current: contextvars.ContextVar[Deadline | None] = contextvars.ContextVar("deadline", default=None)
+
+
+def current() -> Deadline | None:
+    """Returns the deadline of the current turn, if any."""
+    return _current.get()
+
+
+@contextmanager
+def deadline(seconds: float | None):
+    """
+    Sets the deadline for everything called inside the block, a no-op if `seconds` is None.
+
+    Args:
+        seconds (float | None): Seconds until the deadline.
+    """
+    if seconds is None:
+        yield None
+        return
+
+    token = _current.set(Deadline(seconds))
+    try:
+        yield _current.get()
+    finally:
+        _current.reset(token)
+
+
+def timeout(default=None):
+    """
+    The timeout for a call made now: the remaining time of the current deadline capped at `default`
+    if it is a number, otherwise `default` when there is no deadline.
+
+    Raises:
+        DeadlineExceeded: If the deadline has already passed.
+    """
+    if (current_deadline := _current.get()) is None:
+        return default
+    return current_deadline.timeout(default if isinstance(default, (int, float)) else None)
+
+
+def submit(executor: Executor, fn: callable, *args, **kwargs) -> Future:
+    """
+    Submit to an executor so the work sees the current deadline, contextvars don't follow threads otherwise.
+    The work is also profiled with the turn if the turn is being profiled.
+    """
+    return executor.submit(contextvars.copy_context().run, run_profiled, fn, *args, **kwargs)
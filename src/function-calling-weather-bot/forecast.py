@@ -0,0 +1,160 @@
+import bisect
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from function_calling_weather_bot import metrics
+from function_calling_weather_bot.codec import OpenWeatherForecastResponse
+
+# local hours covered by each part of the day, night runs into the next morning
+PARTS_OF_DAY = {
+    "day": (0, 24),
+    "morning": (6, 12),
+    "afternoon": (12, 18),
+    "evening": (18, 24),
+    "night": (21, 30),
+}
+
+
+@dataclass
+class ForecastSlot:
+    time: str
+    description: str
+    icon: str
+    temperature: float
+    precipitation_chance: float
+
+
+@dataclass
+class ForecastData:
+    """
+    Compact forecast for one location and time window, this is what is added to the messages.
+
+    Attributes:
+        location (str): The location of the forecast.
+        country_code (str): The country code of the location.
+        date (str): The local date of the window e.g. 2024-05-24.
+        part_of_day (str): One of PARTS_OF_DAY.
+        temperature_min (float): The lowest temperature in the window.
+        temperature_max (float): The highest temperature in the window.
+        slots (list[ForecastSlot]): Up to `max_slots` evenly spaced forecast points in the window.
+    """
+
+    location: str
+    country_code: str
+    date: str
+    part_of_day: str
+    temperature_min: float = None
+    temperature_max: float = None
+    slots: list[ForecastSlot] = field(default_factory=list)
+
+
+@dataclass
+class LocationForecast:
+    """The full multi-day forecast for one location, indexed by timestamp."""
+
+    location: str
+    country_code: str
+    utc_offset: int
+    fetched_at: float
+    times: list[int]
+    slots: list[ForecastSlot]
+
+    @classmethod
+    def from_response(cls, response: OpenWeatherForecastResponse) -> "LocationForecast":
+        entries = sorted(response.list, key=lambda entry: entry.dt)
+        tz = timezone(timedelta(seconds=response.city.timezone))
+        return cls(
+            location=response.city.name,
+            country_code=response.city.country,
+            utc_offset=response.city.timezone,
+            fetched_at=time.monotonic(),
+            times=[entry.dt for entry in entries],
+            slots=[
+                ForecastSlot(
+                    time=datetime.fromtimestamp(entry.dt, tz).strftime("%a %H:%M"),
+                    description=entry.weather[0].description if entry.weather else "",
+                    icon=entry.weather[0].icon if entry.weather else "",
+                    temperature=entry.main.temp,
+                    precipitation_chance=entry.pop,
+                )
+                for entry in entries
+            ],
+        )
+
+    def select(self, day_offset: int = 0, part_of_day: str = "day", max_slots: int = 4, now: float = None) -> ForecastData:
+        """
+        Slices the forecast to a local day and part of the day.
+
+        Args:
+            day_offset (int): Days from today in the location's timezone, 0 is today.
+            part_of_day (str): One of PARTS_OF_DAY.
+            max_slots (int): Maximum number of forecast points to include.
+            now (float, optional): The current unix time, defaults to time.time().
+
+        Returns:
+            ForecastData: The compact forecast for the window.
+        """
+        if part_of_day not in PARTS_OF_DAY:
+            part_of_day = "day"
+
+        tz = timezone(timedelta(seconds=self.utc_offset))
+        local_now = datetime.fromtimestamp(now or time.time(), tz)
+        day_start = local_now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=day_offset)
+        start_hour, end_hour = PARTS_OF_DAY[part_of_day]
+        start = int((day_start + timedelta(hours=start_hour)).timestamp())
+        end = int((day_start + timedelta(hours=end_hour)).timestamp())
+
+        window = self.slots[bisect.bisect_left(self.times, start) : bisect.bisect_left(self.times, end)]
+        forecast = ForecastData(
+            location=self.location,
+            country_code=self.country_code,
+            date=day_start.strftime("%Y-%m-%d"),
+            part_of_day=part_of_day,
+        )
+        if window:
+            step = max(1, -(-len(window) // max_slots))
+            forecast.slots = window[::step][:max_slots]
+            forecast.temperature_min = min(slot.temperature for slot in window)
+            forecast.temperature_max = max(slot.temperature for slot in window)
+        return forecast
+
+
+class ForecastCache:
+    """
+    Multi-day forecasts per location query so follow up questions about any time in the window are answered locally.
+
+    Args:
+        ttl (float): Seconds a forecast is reused for.
+        max_locations (int): Maximum number of locations kept, least recently used are dropped.
+    """
+
+    def __init__(self, ttl: float = 1800, max_locations: int = 500):
+        self.ttl = ttl
+        self.max_locations = max_locations
+        self._lock = threading.Lock()
+        self._forecasts: dict[str, LocationForecast] = {}
+
+    @staticmethod
+    def _key(query: str) -> str:
+        return ",".join(part.strip() for part in query.lower().split(","))
+
+    def get(self, query: str) -> LocationForecast | None:
+        key = self._key(query)
+        with self._lock:
+            forecast = self._forecasts.get(key)
+            if forecast and time.monotonic() - forecast.fetched_at <= self.ttl:
+                self._forecasts[key] = self._forecasts.pop(key)
+                metrics.incr("forecast_cache.hits")
+                return forecast
+        metrics.incr("forecast_cache.misses")
+        return None
+
+    def put(self, query: str, forecast: LocationForecast) -> None:
+        key = self._key(query)
+        with self._lock:
+            self._forecasts.pop(key, None)
+            self._forecasts[key] = forecast
+            while len(self._forecasts) > self.max_locations:
+                self._forecasts.pop(next(iter(self._forecasts)))
@@ -0,0 +1,98 @@
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE_MAP = {char: i for i, char in enumerate(BASE32)}
+
+
+def encode(latitude: float, longitude: float, precision: int = 5) -> str:
+    """
+    Encode a coordinate as a geohash.
+
+    Args:
+        latitude (float): The latitude in degrees.
+        longitude (float): The longitude in degrees.
+        precision (int): The number of characters, 5 is a cell of roughly 5km x 5km.
+
+    Returns:
+        str: The geohash.
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # even bits are longitude
+    while len(chars) < precision:
+        value, value_range = (longitude, lon_range) if even else (latitude, lat_range)
+        mid = (value_range[0] + value_range[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            value_range[0] = mid
+        else:
+            bits <<= 1
+            value_range[1] = mid
+        even = not even
+
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+def decode(geohash: str) -> tuple[float, float, float, float]:
+    """
+    Decode a geohash into the center of its cell.
+
+    Args:
+        geohash (str): The geohash.
+
+    Returns:
+        tuple[float, float, float, float]: The latitude, longitude and the cell's height and width in degrees.
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = _DECODE_MAP[char]
+        for shift in range(4, -1, -1):
+            value_range = lon_range if even else lat_range
+            mid = (value_range[0] + value_range[1]) / 2
+            if (bits >> shift) & 1:
+                value_range[0] = mid
+            else:
+                value_range[1] = mid
+            even = not even
+
+    return (
+        (lat_range[0] + lat_range[1]) / 2,
+        (lon_range[0] + lon_range[1]) / 2,
+        lat_range[1] - lat_range[0],
+        lon_range[1] - lon_range[0],
+    )
+
+
+def neighbors(geohash: str) -> list[str]:
+    """
+    Get the (up to) 8 cells surrounding a geohash cell at the same precision.
+
+    Args:
+        geohash (str): The geohash.
+
+    Returns:
+        list[str]: The neighboring geohashes, fewer at the poles.
+    """
+    latitude, longitude, lat_size, lon_size = decode(geohash)
+    cells = []
+    for d_lat in (-1, 0, 1):
+        for d_lon in (-1, 0, 1):
+            if d_lat == d_lon == 0:
+                continue
+            lat = latitude + d_lat * lat_size
+            if not -90 < lat < 90:
+                continue
+            # wrap around the antimeridian
+            lon = (longitude + d_lon * lon_size + 180) % 360 - 180
+            cell = encode(lat, lon, len(geohash))
+            if cell not in cells:
+                cells.append(cell)
+    return cells
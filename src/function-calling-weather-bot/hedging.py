@@ -0,0 +1,94 @@
+import threading
+
+from function_calling_weather_bot import metrics
+
+
+def latency_metric(endpoint: str) -> str:
+    """The metric `utils.get_api` records the latency of requests to `endpoint` under."""
+    return f"upstream.{endpoint}.latency_ms"
+
+
+class HedgePolicy:
+    """
+    When to send a duplicate of a slow idempotent GET.
+
+    The hedge goes out after `delay` seconds, or when `delay` is None after the live p95
+    latency of the endpoint once it has `min_samples` observations. The extra load is capped
+    with a token bucket: every request adds `max_ratio` tokens (up to `burst`) and every hedge
+    takes one, so at most `max_ratio` of the requests are duplicated.
+
+    While hedging is on every GET runs on a pool of `max_workers` threads so the caller can take
+    whichever response comes first, size it for the concurrent upstream requests.
+
+    Args:
+        delay (float | None): Seconds before hedging, None to use the endpoint's p95.
+        max_ratio (float): Max share of requests that get a hedge, e.g. 0.05 for 5%.
+        percentile (float): The live latency percentile used when `delay` is None.
+        min_samples (int): Observations needed before the live percentile is used.
+        default_delay (float): Seconds before hedging while there are fewer samples.
+        burst (float): Max tokens saved up while requests are fast.
+        max_workers (int): Threads running the requests and their hedges.
+    """
+
+    def __init__(
+        self,
+        delay: float | None = None,
+        max_ratio: float = 0.05,
+        percentile: float = 95,
+        min_samples: int = 20,
+        default_delay: float = 1.0,
+        burst: float = 2.0,
+        max_workers: int = 64,
+    ):
+        if not 0 <= max_ratio <= 1:
+            raise ValueError(f"max_ratio must be between 0 and 1, got {max_ratio}")
+
+        self.delay = delay
+        self.max_ratio = max_ratio
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.burst = burst
+        self.max_workers = max_workers
+
+        self._lock = threading.Lock()
+        self._tokens = 0.0
+
+    def delay_for(self, endpoint: str) -> float:
+        """
+        Seconds to wait for the first response to `endpoint` before hedging.
+
+        Args:
+            endpoint (str): The host and path of the request.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        if self.delay is not None:
+            return self.delay
+        name = latency_metric(endpoint)
+        if metrics.observation_count(name) < self.min_samples:
+            return self.default_delay
+        return metrics.percentile(name, self.percentile) / 1000
+
+    def record_request(self) -> None:
+        """Note a request that could be hedged, earns `max_ratio` of a hedge."""
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.max_ratio)
+        metrics.incr("hedge.requests")
+
+    def acquire(self) -> bool:
+        """
+        Take the budget for one hedge.
+
+        Returns:
+            bool: True if the hedge can be sent, False if it would go over `max_ratio`.
+        """
+        with self._lock:
+            if self._tokens < 1:
+                allowed = False
+            else:
+                self._tokens -= 1
+                allowed = True
+        metrics.incr("hedge.sent" if allowed else "hedge.over_budget")
+        return allowed
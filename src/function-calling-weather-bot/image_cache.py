@@ -0,0 +1,219 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Sequence
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from function_calling_weather_bot import console, deadline
+
+# content types we are willing to store, mapped to the file extension used in the cache
+IMAGE_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+}
+
+
+class ImageCache:
+    """
+    Content-addressed local cache for weather thumbnails.
+
+    Images are downloaded over a pooled session, stored as `{sha256}{ext}` so the same image
+    found under different URLs is only kept once, and evicted least-recently-used once the
+    cache grows past `max_bytes`. URLs that are definitely broken (a 4xx or not an image) are
+    skipped for `dead_ttl` seconds, timeouts and 5xx are retried on the next fetch.
+
+    Args:
+        cache_dir (str | Path): Directory to store the images in.
+        max_bytes (int): Maximum total size of the cache on disk.
+        base_url (str, optional): If given, local URLs are `{base_url}/{filename}` (e.g. when the
+            directory is served by a static file server), otherwise `file://` URIs are returned.
+        max_workers (int): Number of background download threads and pooled connections.
+        timeout (float): Timeout in seconds for each download.
+        dead_ttl (float): Seconds a broken URL is skipped for.
+        max_dead_urls (int): Max broken URLs remembered, the oldest are forgotten first.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str | Path,
+        max_bytes: int = 50 * 1024 * 1024,
+        base_url: str = None,
+        max_workers: int = 4,
+        timeout: float = 5.0,
+        dead_ttl: float = 3600.0,
+        max_dead_urls: int = 1024,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self.timeout = timeout
+        self.dead_ttl = dead_ttl
+        self.max_dead_urls = max_dead_urls
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-prefetch")
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, int] = OrderedDict()  # filename -> size, oldest first
+        self._url_index: dict[str, str] = {}  # remote url -> filename
+        self._dead_urls: OrderedDict[str, float] = OrderedDict()  # remote url -> skipped until, oldest first
+        self._total_bytes = 0
+
+        self._load_existing()
+
+    def _load_existing(self) -> None:
+        """Seed the LRU order from files already on disk, least recently touched first."""
+        files = [f for f in self.cache_dir.iterdir() if f.is_file() and f.suffix in IMAGE_EXTENSIONS.values()]
+        for file in sorted(files, key=lambda f: f.stat().st_mtime):
+            size = file.stat().st_size
+            self._entries[file.name] = size
+            self._total_bytes += size
+        self._evict()
+
+    def _local_url(self, filename: str) -> str:
+        if self.base_url:
+            return f"{self.base_url}/{filename}"
+        return (self.cache_dir / filename).resolve().as_uri()
+
+    def _touch(self, filename: str) -> None:
+        # needs to be called with the lock held
+        self._entries.move_to_end(filename)
+        try:
+            os.utime(self.cache_dir / filename)
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        # needs to be called with the lock held
+        while self._total_bytes > self.max_bytes and self._entries:
+            filename, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            (self.cache_dir / filename).unlink(missing_ok=True)
+            self._url_index = {url: name for url, name in self._url_index.items() if name != filename}
+
+    def _is_dead(self, url: str) -> bool:
+        with self._lock:
+            if (expires_at := self._dead_urls.get(url)) is None:
+                return False
+            if expires_at > time.monotonic():
+                return True
+            del self._dead_urls[url]
+            return False
+
+    def _mark_dead(self, url: str) -> None:
+        with self._lock:
+            self._dead_urls.pop(url, None)
+            self._dead_urls[url] = time.monotonic() + self.dead_ttl
+            while len(self._dead_urls) > self.max_dead_urls:
+                self._dead_urls.popitem(last=False)
+
+    def get(self, url: str) -> str | None:
+        """
+        Get the local URL for an already cached remote URL.
+
+        Args:
+            url (str): The remote image URL.
+
+        Returns:
+            str | None: The local URL, or None if the image is not cached.
+        """
+        with self._lock:
+            if (filename := self._url_index.get(url)) and filename in self._entries:
+                self._touch(filename)
+                return self._local_url(filename)
+        return None
+
+    def store(self, url: str, content: bytes, content_type: str) -> str | None:
+        """
+        Store image bytes under their content hash.
+
+        Args:
+            url (str): The remote URL the content was fetched from.
+            content (bytes): The image bytes.
+            content_type (str): The content type of the image.
+
+        Returns:
+            str | None: The local URL, or None if the content can't be cached.
+        """
+        ext = IMAGE_EXTENSIONS.get(content_type.split(";")[0].strip().lower())
+        if not ext or not content or len(content) > self.max_bytes:
+            return None
+
+        filename = hashlib.sha256(content).hexdigest() + ext
+        with self._lock:
+            if filename not in self._entries:
+                tmp_file = self.cache_dir / f".{filename}.tmp"
+                tmp_file.write_bytes(content)
+                tmp_file.replace(self.cache_dir / filename)
+                self._entries[filename] = len(content)
+                self._total_bytes += len(content)
+
+            self._url_index[url] = filename
+            self._touch(filename)
+            self._evict()
+            return self._local_url(filename) if filename in self._entries else None
+
+    def fetch(self, url: str) -> str | None:
+        """
+        Fetch an image into the cache, skipping URLs that are known to be broken.
+
+        Args:
+            url (str): The remote image URL.
+
+        Returns:
+            str | None: The local URL, or None if the image could not be fetched.
+        """
+        if not url or self._is_dead(url):
+            return None
+
+        if local_url := self.get(url):
+            return local_url
+
+        try:
+            response = self._session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as err:
+            console.debug(f"Image fetch failed for {url}: {err}")
+            # a 4xx won't get better, timeouts, connection errors and 5xx might
+            status = getattr(err.response, "status_code", None)
+            if status is not None and 400 <= status < 500:
+                self._mark_dead(url)
+            return None
+
+        if (local_url := self.store(url, response.content, response.headers.get("Content-Type", ""))) is None:
+            self._mark_dead(url)
+        return local_url
+
+    def _fetch_first(self, urls: Sequence[str]) -> str | None:
+        for url in urls:
+            if local_url := self.fetch(url):
+                return local_url
+        return None
+
+    def prefetch(self, urls: Sequence[str]) -> Future:
+        """
+        Fetch the first working image of `urls` in the background.
+
+        Args:
+            urls (Sequence[str]): Candidate image URLs in order of preference.
+
+        Returns:
+            Future: Resolves to the local URL of the first image that could be cached, or None.
+        """
+        return deadline.submit(self._executor, self._fetch_first, list(urls))
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._session.close()
@@ -0,0 +1,136 @@
+import argparse
+import json
+import random
+from os import getenv
+from pathlib import Path
+
+import requests
+
+from function_calling_weather_bot import ICONS, console, metrics
+
+# what each OpenWeather icon code looks like, used to search for images when building the library
+CONDITION_QUERIES = {
+    "01": "clear sky",
+    "02": "few clouds",
+    "03": "scattered clouds",
+    "04": "overcast clouds",
+    "09": "rain showers",
+    "10": "rain",
+    "11": "thunderstorm",
+    "13": "snow",
+    "50": "mist fog",
+}
+
+
+class ImageLibrary:
+    """
+    Vetted image URLs per OpenWeather icon code (e.g. "01d"), optionally per country ("01d:US").
+
+    Built offline with `python -m function_calling_weather_bot.image_library` and loaded at
+    startup, so picking an image for a condition is a dict lookup instead of an image search.
+
+    Args:
+        images (dict[str, list[str]]): Image URLs keyed by "{icon_code}" or "{icon_code}:{country_code}".
+    """
+
+    def __init__(self, images: dict[str, list[str]]):
+        self._images = {key: tuple(urls) for key, urls in images.items() if urls}
+
+    @classmethod
+    def load(cls, path: str | Path) -> "ImageLibrary":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f)["images"])
+
+    def save(self, path: str | Path) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"images": {key: list(urls) for key, urls in self._images.items()}}, f, separators=(",", ":"))
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+    def select(self, icon_code: str, country_code: str = None) -> str | None:
+        """
+        Pick an image for a condition, preferring the country specific images.
+
+        Args:
+            icon_code (str): The OpenWeather icon code e.g. "10n".
+            country_code (str, optional): The country code e.g. "US".
+
+        Returns:
+            str | None: An image URL or None if the condition is not covered.
+        """
+        if not icon_code:
+            return None
+        urls = self._images.get(f"{icon_code}:{country_code}") if country_code else None
+        if urls := urls or self._images.get(icon_code):
+            metrics.incr("image_library.hits")
+            return random.choice(urls)
+        metrics.incr("image_library.misses")
+        return None
+
+
+def _is_image(session: requests.Session, url: str) -> bool:
+    try:
+        response = session.head(url, timeout=5, allow_redirects=True)
+        return response.ok and response.headers.get("Content-Type", "").startswith("image/")
+    except requests.RequestException:
+        return False
+
+
+def build(search: callable, countries: list[str] = (), per_condition: int = 10) -> ImageLibrary:
+    """
+    Build the library by searching images for every icon code and keeping the ones that load.
+
+    Args:
+        search (callable): Function taking a `query` and returning `{"images": [{"image_url": ...}]}`
+            e.g. `Services.bing_funcs["get_weather_image"]`.
+        countries (list[str]): Country codes to also build country specific images for.
+        per_condition (int): Number of images kept per key.
+
+    Returns:
+        ImageLibrary: The built library.
+    """
+    session = requests.Session()
+    images = {}
+    for icon_code in ICONS:
+        description = CONDITION_QUERIES[icon_code[:2]]
+        time_of_day = "day" if icon_code.endswith("d") else "night"
+        for country in [None, *countries]:
+            query = f"{description} {time_of_day} weather" + (f" in {country}" if country else "")
+            try:
+                results = search(query=query)["images"]
+            except Exception as err:
+                console.warn(f"Image search failed for {query}: {err}")
+                continue
+
+            urls = []
+            for result in results:
+                if (url := result["image_url"]) and _is_image(session, url):
+                    urls.append(url)
+                if len(urls) == per_condition:
+                    break
+
+            key = f"{icon_code}:{country}" if country else icon_code
+            images[key] = urls
+            console.info(f"{key}: {len(urls)} images")
+    return ImageLibrary(images)
+
+
+if __name__ == "__main__":
+    from function_calling_weather_bot.services import Services
+
+    parser = argparse.ArgumentParser(description="Build the condition to image library")
+    parser.add_argument("--out", default="image_library.json", help="Where to write the library")
+    parser.add_argument("--countries", default="", help="Comma separated country codes for regional images")
+    parser.add_argument("--per-condition", type=int, default=10, help="Images kept per condition")
+    parser.add_argument("--bing-api-key", default=getenv("BING_API_KEY"), help="Bing Image Search API key")
+    args = parser.parse_args()
+
+    services = Services(weather_api_key="unused", bing_api_key=args.bing_api_key)
+    library = build(
+        services.bing_funcs["get_weather_image"],
+        countries=[c.strip().upper() for c in args.countries.split(",") if c.strip()],
+        per_condition=args.per_condition,
+    )
+    library.save(args.out)
+    console.success(f"Wrote {len(library)} conditions to {args.out}")
@@ -0,0 +1,239 @@
+import hashlib
+import threading
+import time
+from typing import Sequence
+
+from function_calling_weather_bot import console, deadline, metrics
+
+# status codes that take a key out of rotation for a while
+RATE_LIMITED = 429
+UNAUTHORIZED = 401
+
+
+class KeyPoolExhausted(Exception):
+    """Raised when every key of a pool is cooling down or out of quota."""
+
+
+def key_id(key: str) -> str:
+    """A short fingerprint of a key that is safe to log."""
+    return hashlib.sha256(key.encode()).hexdigest()[:8]
+
+
+def _retry_after(err: Exception) -> float | None:
+    # seconds the upstream asked us to wait, if it said
+    headers = getattr(getattr(err, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _status_code(err: Exception) -> int | None:
+    # requests.HTTPError and the openai errors both have the status on the response
+    if (status := getattr(err, "status_code", None)) is not None:
+        return status
+    return getattr(getattr(err, "response", None), "status_code", None)
+
+
+class KeyPool:
+    """
+    A pool of API keys for one upstream.
+
+    Keys are picked with smooth weighted round-robin ("weighted") or by the lowest usage
+    relative to their weight ("least_used"). Keys returning 429 are taken out of rotation for
+    `cooldown` seconds and keys returning 401 for ten times that. If `quota` is set a key is
+    also skipped once it has been used `quota` times in the current `quota_window`.
+
+    The last available key is never taken out of rotation, that would fail every request until
+    it cools down. A 429 on it is retried up to `max_backoffs` times after the upstream's
+    Retry-After or an exponential backoff, as long as the turn deadline allows.
+
+    Args:
+        keys (Sequence[str]): The API keys.
+        weights (Sequence[float], optional): Relative weight per key, defaults to 1 each.
+        strategy (str): "weighted" or "least_used".
+        name (str): Name of the upstream, used in logs and metrics.
+        cooldown (float): Seconds a rate limited key is skipped.
+        quota (int, optional): Requests per key per `quota_window`.
+        quota_window (float): Seconds per quota window, a day by default.
+        backoff (float): Seconds before the first retry of a rate limited last key, doubled each retry.
+        max_backoffs (int): Retries of a rate limited last key before giving up.
+    """
+
+    def __init__(
+        self,
+        keys: Sequence[str],
+        weights: Sequence[float] = None,
+        strategy: str = "weighted",
+        name: str = "upstream",
+        cooldown: float = 60.0,
+        quota: int = None,
+        quota_window: float = 86400,
+        backoff: float = 1.0,
+        max_backoffs: int = 2,
+    ):
+        keys = [key for key in keys if key]
+        if not keys:
+            raise ValueError(f"At least one API key is required for {name}")
+        if strategy not in ("weighted", "least_used"):
+            raise ValueError(f"Unknown key selection strategy: {strategy}")
+
+        self.keys = list(keys)
+        self.weights = dict(zip(self.keys, weights or [1.0] * len(self.keys)))
+        self.strategy = strategy
+        self.name = name
+        self.cooldown = cooldown
+        self.quota = quota
+        self.quota_window = quota_window
+        self.backoff = backoff
+        self.max_backoffs = max_backoffs
+
+        self._lock = threading.Lock()
+        self._current = {key: 0.0 for key in self.keys}
+        self._used = {key: 0 for key in self.keys}
+        self._window_start = time.monotonic()
+        self._unavailable_until = {key: 0.0 for key in self.keys}
+
+    @classmethod
+    def from_keys(cls, keys: "str | Sequence[str] | KeyPool", **kwargs) -> "KeyPool":
+        """
+        Build a pool from a single key, a comma separated string of keys, a list of keys or an existing pool.
+
+        Keys can be given a weight as `key:weight`.
+        """
+        if isinstance(keys, KeyPool):
+            return keys
+        if isinstance(keys, str):
+            keys = keys.split(",")
+
+        parsed, weights = [], []
+        for key in keys:
+            key, _, weight = key.strip().partition(":")
+            parsed.append(key)
+            weights.append(float(weight) if weight else 1.0)
+        return cls(parsed, weights=weights, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _available(self, now: float) -> list[str]:
+        # needs to be called with the lock held
+        if now - self._window_start >= self.quota_window:
+            self._window_start = now
+            self._used = {key: 0 for key in self.keys}
+
+        return [
+            key
+            for key in self.keys
+            if self._unavailable_until[key] <= now and (self.quota is None or self._used[key] < self.quota)
+        ]
+
+    def acquire(self) -> str:
+        """
+        Pick the key for the next request.
+
+        Raises:
+            KeyPoolExhausted: If no key is available.
+
+        Returns:
+            str: The key.
+        """
+        with self._lock:
+            if not (available := self._available(time.monotonic())):
+                raise KeyPoolExhausted(f"No {self.name} API key available")
+
+            if self.strategy == "least_used":
+                key = min(available, key=lambda k: self._used[k] / self.weights[k])
+            else:
+                total = 0.0
+                for k in available:
+                    self._current[k] += self.weights[k]
+                    total += self.weights[k]
+                key = max(available, key=lambda k: self._current[k])
+                self._current[key] -= total
+
+            self._used[key] += 1
+
+        metrics.incr(f"keypool.{self.name}.{key_id(key)}.used")
+        return key
+
+    def report(self, key: str, status: int | None) -> None:
+        """
+        Report the status code of a request made with `key`, 401 and 429 take it out of rotation.
+
+        Args:
+            key (str): The key used.
+            status (int | None): The status code of the response.
+        """
+        if status not in (RATE_LIMITED, UNAUTHORIZED):
+            return
+
+        cooldown = self.cooldown * (10 if status == UNAUTHORIZED else 1)
+        with self._lock:
+            self._unavailable_until[key] = time.monotonic() + cooldown
+        console.warn(f"{self.name} key {key_id(key)} returned {status}, removed for {cooldown:.0f}s")
+        metrics.incr(f"keypool.{self.name}.{key_id(key)}.removed")
+
+    def _others_available(self, key: str) -> bool:
+        with self._lock:
+            return any(k != key for k in self._available(time.monotonic()))
+
+    def call(self, fn: callable):
+        """
+        Call `fn(key)` and move on to the next key if it is rate limited or rejected.
+        If it was the last available key, a 429 is retried with backoff instead.
+
+        Args:
+            fn (callable): Function taking the API key.
+
+        Raises:
+            KeyPoolExhausted: If no key is available.
+
+        Returns:
+            The result of `fn`.
+        """
+        last_err = None
+        backoffs = 0
+        for _ in range(len(self.keys) + self.max_backoffs):
+            try:
+                key = self.acquire()
+            except KeyPoolExhausted:
+                if last_err:
+                    raise last_err
+                raise
+
+            try:
+                return fn(key)
+            except Exception as err:
+                status = _status_code(err)
+                if status not in (RATE_LIMITED, UNAUTHORIZED):
+                    raise
+                last_err = err
+                if self._others_available(key):
+                    self.report(key, status)
+                    continue
+
+                # the last key, retrying won't fix a 401 and a 429 only needs a moment
+                if status == UNAUTHORIZED or backoffs == self.max_backoffs:
+                    raise
+                sleep_time = _retry_after(err) or self.backoff * 2**backoffs
+                if (turn_deadline := deadline.current()) and turn_deadline.remaining() <= sleep_time:
+                    raise
+                backoffs += 1
+                metrics.incr(f"keypool.{self.name}.backoffs")
+                console.debug(f"{self.name} key {key_id(key)} rate limited, retrying in {sleep_time:.1f}s")
+                time.sleep(sleep_time)
+        raise last_err
+
+    def stats(self) -> dict[str, dict]:
+        """Usage per key fingerprint, the keys themselves are never included."""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                key_id(key): {
+                    "used": self._used[key],
+                    "weight": self.weights[key],
+                    "available": self._unavailable_until[key] <= now,
+                }
+                for key in self.keys
+            }
@@ -0,0 +1,111 @@
+import threading
+from collections import defaultdict, deque
+
+# Simple in-process metrics, counters and a bounded window of observations per name.
+
+# Number of observations kept per name for the summary stats.
+WINDOW = 1000
+
+_lock = threading.Lock()
+_counters: dict[str, int] = defaultdict(int)
+_observations: dict[str, deque[float]] = defaultdict(lambda: deque(maxlen=WINDOW))
+
+
+def incr(name: str, value: int = 1) -> None:
+    """
+    Increment a counter.
+
+    Args:
+        name: The counter name e.g. "speculation.hits".
+        value: The amount to increment by.
+    """
+    with _lock:
+        _counters[name] += value
+
+
+def observe(name: str, value: float) -> None:
+    """
+    Record an observation e.g. a latency.
+
+    Args:
+        name: The metric name e.g. "llm.latency_ms".
+        value: The observed value.
+    """
+    with _lock:
+        _observations[name].append(value)
+
+
+def count(name: str) -> int:
+    """
+    Get the current value of a counter.
+
+    Args:
+        name: The counter name.
+
+    Returns:
+        The counter value, 0 if never incremented.
+    """
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def observation_count(name: str) -> int:
+    """
+    Get the number of observations in the window.
+
+    Args:
+        name: The metric name.
+
+    Returns:
+        The number of observations kept, at most WINDOW.
+    """
+    with _lock:
+        return len(_observations.get(name, ()))
+
+
+def percentile(name: str, pct: float) -> float | None:
+    """
+    Get a percentile of the recent observations.
+
+    Args:
+        name: The metric name.
+        pct: The percentile between 0 and 100.
+
+    Returns:
+        The percentile or None if there are no observations.
+    """
+    with _lock:
+        values = sorted(_observations.get(name, ()))
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def snapshot() -> dict:
+    """
+    Get all counters and summary stats of the observations.
+
+    Returns:
+        A dict with "counters" and "observations" where each observation has count/mean/p50/p95/max.
+    """
+    with _lock:
+        counters = dict(_counters)
+        observations = {name: sorted(values) for name, values in _observations.items() if values}
+
+    summaries = {}
+    for name, values in observations.items():
+        summaries[name] = {
+            "count": len(values),
+            "mean": sum(values) / len(values),
+            "p50": values[len(values) // 2],
+            "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+            "max": values[-1],
+        }
+    return {"counters": counters, "observations": summaries}
+
+
+def reset() -> None:
+    """Clear all metrics."""
+    with _lock:
+        _counters.clear()
+        _observations.clear()
@@ -0,0 +1,140 @@
+import argparse
+import contextvars
+import cProfile
+import io
+import pstats
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable
+
+# profiles of the worker threads that ran for the current turn, None if the turn isn't profiled
+_worker_profiles: contextvars.ContextVar[list[cProfile.Profile] | None] = contextvars.ContextVar(
+    "worker_profiles", default=None
+)
+
+
+def run_profiled(fn: callable, *args, **kwargs):
+    """
+    Run `fn` under its own profiler if the turn that submitted it is being profiled.
+
+    cProfile only sees the thread that enabled it, so work handed to pool threads is profiled
+    separately and merged into the turn's profile. `deadline.submit` runs everything through this.
+    """
+    if (profiles := _worker_profiles.get()) is None:
+        return fn(*args, **kwargs)
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profiler.disable()
+        profiles.append(profiler)
+
+
+class TurnProfiler:
+    """
+    Profiles conversation turns with cProfile and dumps selected turns to `{output_dir}/turn-{n}-{trace_id}.prof`.
+
+    A turn is dumped if it is every `every_n`th turn or if it took longer than `threshold_ms`.
+    When a threshold is set every turn has to run under the profiler since we only know the
+    latency afterwards, otherwise only the sampled turns pay the profiling overhead.
+
+    Work the turn submits to pool threads with `deadline.submit` (image searches, speculative
+    lookups, hedged requests) is profiled on those threads and included in the dump if it
+    finished before the turn did.
+
+    Args:
+        output_dir (str | Path): Directory to write the profile files to.
+        every_n (int): Dump every nth turn, 0 to disable.
+        threshold_ms (float, optional): Dump turns slower than this many milliseconds.
+    """
+
+    def __init__(self, output_dir: str | Path = "profiles", every_n: int = 1, threshold_ms: float = None):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.every_n = every_n
+        self.threshold_ms = threshold_ms
+        self.turn_count = 0
+        self._active = False
+
+    def _is_sampled(self) -> bool:
+        return bool(self.every_n) and self.turn_count % self.every_n == 0
+
+    @contextmanager
+    def profile_turn(self, trace_id: str):
+        """
+        Context manager that runs the body under the profiler if the turn is selected.
+        Nested calls are a no-op so a turn is only profiled once.
+
+        Args:
+            trace_id (str): The trace id of the turn, used in the file name.
+        """
+        if self._active:
+            yield
+            return
+
+        self.turn_count += 1
+        sampled = self._is_sampled()
+        if not sampled and self.threshold_ms is None:
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        worker_profiles = []
+        token = _worker_profiles.set(worker_profiles)
+        self._active = True
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            _worker_profiles.reset(token)
+            self._active = False
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if sampled or elapsed_ms >= self.threshold_ms:
+                stats = pstats.Stats(profiler)
+                for worker_profile in list(worker_profiles):
+                    stats.add(worker_profile)
+                stats.dump_stats(self.output_dir / f"turn-{self.turn_count:05d}-{trace_id}.prof")
+
+
+def summarize(paths: Iterable[str | Path], top: int = 20, sort: str = "cumulative") -> str:
+    """
+    Aggregates multiple profile files and returns the top functions as text.
+
+    Args:
+        paths (Iterable[str | Path]): Profile files or directories containing `.prof` files.
+        top (int): Number of functions to include.
+        sort (str): pstats sort key e.g. "cumulative" or "tottime".
+
+    Returns:
+        str: The formatted stats.
+    """
+    files = []
+    for path in map(Path, paths):
+        files.extend(sorted(path.glob("*.prof")) if path.is_dir() else [path])
+
+    if not files:
+        return "No profile files found."
+
+    out = io.StringIO()
+    stats = pstats.Stats(str(files[0]), stream=out)
+    for file in files[1:]:
+        stats.add(str(file))
+
+    out.write(f"Aggregated {len(files)} turns\n")
+    stats.strip_dirs().sort_stats(sort).print_stats(top)
+    return out.getvalue()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize per-turn profiles")
+    parser.add_argument("paths", nargs="+", help="Profile files or directories")
+    parser.add_argument("--top", type=int, default=20, help="Number of functions to show")
+    parser.add_argument("--sort", default="cumulative", help="pstats sort key")
+    args = parser.parse_args()
+
+    print(summarize(args.paths, top=args.top, sort=args.sort))
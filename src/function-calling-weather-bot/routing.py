@@ -0,0 +1,66 @@
+from function_calling_weather_bot.speculation import extract_locations
+
+# the llm calls made during a turn
+TOOL_SELECTION = "tool_selection"
+PHRASING = "phrasing"
+ERROR = "error"
+STAGES = (TOOL_SELECTION, PHRASING, ERROR)
+
+
+class ModelRouter:
+    """
+    Picks the model for each llm call of a turn.
+
+    Each stage has its own model and turns that look hard are escalated to `escalation_model`:
+    tool selection when the input mentions several locations or none we can spot (likely a
+    follow up that needs the conversation), phrasing when it combines several tool results.
+
+    Args:
+        default_model (str): The model for stages without their own.
+        models (dict[str, str], optional): Model per stage, see STAGES.
+        escalation_model (str, optional): The model for hard turns, no escalation if not set.
+    """
+
+    def __init__(self, default_model: str = "gpt-4o", models: dict[str, str] = None, escalation_model: str = None):
+        unknown = set(models or {}) - set(STAGES)
+        if unknown:
+            raise ValueError(f"Unknown stages: {unknown}")
+
+        self.default_model = default_model
+        self.models = {stage: (models or {}).get(stage) or default_model for stage in STAGES}
+        self.escalation_model = escalation_model
+
+    def should_escalate(self, stage: str, user_input: str = None, tool_calls: list = None) -> bool:
+        """
+        Whether the call for `stage` should use the escalation model.
+
+        Args:
+            stage (str): One of STAGES.
+            user_input (str, optional): The raw user input, used for tool selection.
+            tool_calls (list, optional): The tool calls of the turn, used for phrasing.
+
+        Returns:
+            bool: True if the turn looks hard enough for the escalation model.
+        """
+        if not self.escalation_model:
+            return False
+        if stage == TOOL_SELECTION and user_input is not None:
+            return len(extract_locations(user_input, max_candidates=2)) != 1
+        if stage == PHRASING and tool_calls:
+            return len(tool_calls) > 1
+        return False
+
+    def model_for(self, stage: str, escalate: bool = False) -> str:
+        """
+        The model to use for `stage`.
+
+        Args:
+            stage (str): One of STAGES.
+            escalate (bool): Use the escalation model if there is one.
+
+        Returns:
+            str: The model id.
+        """
+        if escalate and self.escalation_model:
+            return self.escalation_model
+        return self.models.get(stage, self.default_model)
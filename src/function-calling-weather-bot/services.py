@@ -1,6 +1,18 @@
 from functools import partial
 
 from function_calling_weather_bot import services_spec, utils
+from function_calling_weather_bot.forecast import ForecastCache
+from function_calling_weather_bot.keypool import KeyPool
+from function_calling_weather_bot.services_spec import (
+    get_forecast_from_city_name,
+    get_weather_from_city_name,
+    get_weather_from_city_name_and_country,
+    get_weather_from_city_name_and_state_code_and_country_code,
+    get_weather_from_coordinates,
+    get_weather_image,
+)
+from function_calling_weather_bot.utils import WeatherData
+from function_calling_weather_bot.weather_cache import SpatialWeatherCache
 
 
 class Services:
@@ -8,8 +20,12 @@ class Services:
     A class that provides various services related to weather and images.
 
     Args:
-        weather_api_key (str): The API key for accessing the weather service.
-        bing_api_key (str): The API key for accessing the image search service.
+        weather_api_key (str | list[str] | KeyPool): The API key(s) for accessing the weather service,
+            multiple keys can be given comma separated.
+        bing_api_key (str | list[str] | KeyPool): The API key(s) for accessing the image search service.
+        weather_cache (SpatialWeatherCache, optional): Geohash cache shared by all weather lookups.
+        forecast_cache (ForecastCache, optional): Cache of the multi-day forecasts per location.
+        key_strategy (str): How keys are picked from the pools, "weighted" or "least_used".
 
     Raises:
         ValueError: If `weather_api_key` or `bing_api_key` is not provided.
@@ -25,44 +41,67 @@ class Services:
 
     available_services_specs = available_weather_specs + available_image_specs
 
-    def __init__(self, weather_api_key: str, bing_api_key: str):
+    def __init__(
+        self,
+        weather_api_key: str,
+        bing_api_key: str,
+        weather_cache: SpatialWeatherCache = None,
+        forecast_cache: ForecastCache = None,
+        key_strategy: str = "weighted",
+    ):
         if not weather_api_key:
             raise ValueError("Weather API key is required. Use kwarg or set OPEN_WEATHER_API_KEY")
         if not bing_api_key:
             raise ValueError("Bing API key is required. Use kwarg or set BING_API_KEY")
 
-        self.setup_weather_funcs(weather_api_key)
-        self.setup_bing_funcs(bing_api_key)
+        self.weather_cache = weather_cache
+        self.forecast_cache = forecast_cache
+        self.weather_keys = KeyPool.from_keys(weather_api_key, name="openweather", strategy=key_strategy)
+        self.bing_keys = KeyPool.from_keys(bing_api_key, name="bing", strategy=key_strategy)
+        self.setup_weather_funcs(self.weather_keys)
+        self.setup_bing_funcs(self.bing_keys)
 
         self.available_tools = {
             **self.weather_funcs,
             **self.bing_funcs,
         }
 
-    def setup_weather_funcs(self, api_key: str):
+    def setup_weather_funcs(self, api_keys: KeyPool):
         """
         Set up weather-related functions.
 
         Args:
-            api_key (str): The API key for accessing the weather service.
+            api_keys (KeyPool): The API keys for accessing the weather service.
         """
+        # the pool is passed down so a key is only taken for upstream requests, not for cache hits
+        cache = self.weather_cache
         self.weather_funcs = {
-            "get_weather_from_city_name": partial(services_spec.get_weather_from_city_name, api_key=api_key),
+            "get_weather_from_city_name": partial(
+                services_spec.get_weather_from_city_name, api_key=api_keys, weather_cache=cache
+            ),
             "get_weather_from_city_name_and_country": partial(
-                services_spec.get_weather_from_city_name_and_country, api_key=api_key
+                services_spec.get_weather_from_city_name_and_country, api_key=api_keys, weather_cache=cache
             ),
             "get_weather_from_city_name_and_state_code_and_country_code": partial(
-                services_spec.get_weather_from_city_name_and_state_code_and_country_code, api_key=api_key
+                services_spec.get_weather_from_city_name_and_state_code_and_country_code,
+                api_key=api_keys,
+                weather_cache=cache,
+            ),
+            "get_weather_from_coordinates": partial(
+                services_spec.get_weather_from_coordinates, api_key=api_keys, weather_cache=cache
+            ),
+            "get_forecast_from_city_name": partial(
+                services_spec.get_forecast_from_city_name, api_key=api_keys, forecast_cache=self.forecast_cache
             ),
         }
 
-    def setup_bing_funcs(self, api_key: str):
+    def setup_bing_funcs(self, api_keys: KeyPool):
         """
         Set up image-related functions.
 
         Args:
-            api_key (str): The API key for accessing the image search service.
+            api_keys (KeyPool): The API keys for accessing the image search service.
         """
         self.bing_funcs = {
-            "get_weather_image": partial(services_spec.get_weather_image, api_key=api_key),
+            "get_weather_image": partial(services_spec.get_weather_image, api_key=api_keys),
         }
@@ -1,6 +1,15 @@
 # Could put this on the function itself as docs and grab
-from function_calling_weather_bot import console
-from function_calling_weather_bot.utils import _get_api, _get_weather, Tool
+from function_calling_weather_bot import codec, console
+from function_calling_weather_bot.codec import BingImageResponse
+from function_calling_weather_bot.keypool import KeyPool
+from function_calling_weather_bot.utils import (
+    call_with_key as _call_with_key,
+    get_api as _get_api,
+    get_weather as _get_weather,
+    get_weather_from_coordinates as _get_weather_from_coordinates,
+    get_forecast as _get_forecast,
+    Tool,
+)
 
 
 BASE_WEATHER_API = "https://api.openweathermap.org"
@@ -22,22 +31,23 @@ BASE_BING_API = "https://api.bing.microsoft.com/v7.0"
                     "description": "The city e.g. Boise",
                 },
             },
-            "required": ["location"],
+            "required": ["city_name"],
         },
     },
 })
-def get_weather_from_city_name(city_name: str, api_key: str):
+def get_weather_from_city_name(city_name: str, api_key: str | KeyPool, weather_cache=None):
     """
     Retrieves weather information for a given city name.
 
     Args:
         city_name (str): The name of the city.
-        api_key (str): The API key for accessing the weather data.
+        api_key (str | KeyPool): The API key for accessing the weather data.
+        weather_cache (SpatialWeatherCache, optional): Cache of recent observations.
 
     Returns:
         dict: A dictionary containing the weather information for the specified city.
     """
-    return _get_weather(location=city_name, api_key=api_key)
+    return _get_weather(location=city_name, api_key=api_key, weather_url=BASE_WEATHER_API, cache=weather_cache)
 
 
 """
@@ -64,20 +74,23 @@ def get_weather_from_city_name(city_name: str, api_key: str):
         },
     },
 })
-def get_weather_from_city_name_and_country(city_name: str, country: str, api_key: str):
+def get_weather_from_city_name_and_country(city_name: str, country: str, api_key: str | KeyPool, weather_cache=None):
     """
     Retrieves the weather information for a given city and country.
 
     Args:
         city_name (str): The name of the city.
         country (str): The country code.
-        api_key (str): The API key for accessing the weather data.
+        api_key (str | KeyPool): The API key for accessing the weather data.
+        weather_cache (SpatialWeatherCache, optional): Cache of recent observations.
 
     Returns:
         dict: A dictionary containing the weather information.
 
     """
-    return _get_weather(location=f"{city_name},{country}", api_key=api_key, weather_url=BASE_WEATHER_API)
+    return _get_weather(
+        location=f"{city_name},{country}", api_key=api_key, weather_url=BASE_WEATHER_API, cache=weather_cache
+    )
 
 
 """
@@ -109,10 +122,120 @@ def get_weather_from_city_name_and_country(city_name: str, country: str, api_key
     },
 })
 def get_weather_from_city_name_and_state_code_and_country_code(
-    city_name: str, state_code: str, country_code: str, api_key: str
+    city_name: str, state_code: str, country_code: str, api_key: str | KeyPool, weather_cache=None
 ):
     # api.openweathermap.org/data/2.5/weather?q={city name},{state code},{country code}&appid={API key}
-    return _get_weather(f"{city_name},{state_code},{country_code}", api_key, weather_url=BASE_WEATHER_API)
+    return _get_weather(
+        f"{city_name},{state_code},{country_code}", api_key, weather_url=BASE_WEATHER_API, cache=weather_cache
+    )
+
+
+"""
+    Retrieves the weather information for a latitude and longitude.
+"""
+@Tool.spec({
+    "type": "function",
+    "function": {
+        "name": "get_weather_from_coordinates",
+        "description": "Get the current weather at a latitude and longitude",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "latitude": {
+                    "type": "number",
+                    "description": "The latitude in decimal degrees e.g. 43.61",
+                },
+                "longitude": {
+                    "type": "number",
+                    "description": "The longitude in decimal degrees e.g. -116.20",
+                },
+            },
+            "required": ["latitude", "longitude"],
+        },
+    },
+})
+def get_weather_from_coordinates(latitude: float, longitude: float, api_key: str | KeyPool, weather_cache=None):
+    """
+    Retrieves the weather information for a coordinate, reusing observations in nearby geohash cells.
+
+    Args:
+        latitude (float): The latitude.
+        longitude (float): The longitude.
+        api_key (str | KeyPool): The API key for accessing the weather data.
+        weather_cache (SpatialWeatherCache, optional): Cache of recent observations.
+
+    Returns:
+        WeatherData: The weather information at the coordinate.
+    """
+    return _get_weather_from_coordinates(
+        latitude, longitude, api_key=api_key, weather_url=BASE_WEATHER_API, cache=weather_cache
+    )
+
+
+"""
+    Retrieves the forecast for a given city for a day and part of the day.
+"""
+@Tool.spec({
+    "type": "function",
+    "function": {
+        "name": "get_forecast_from_city_name",
+        "description": "Get the forecast for a city for today or one of the next 5 days, optionally for part of the day. Use this for questions like 'and tomorrow?' or 'what about tonight?'",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "city_name": {
+                    "type": "string",
+                    "description": "The city e.g. Boise",
+                },
+                "country": {
+                    "type": "string",
+                    "description": "The country as ISO 3166 country code e.g. US",
+                },
+                "day_offset": {
+                    "type": "integer",
+                    "description": "Days from today, 0 is today and 1 is tomorrow, up to 5",
+                },
+                "part_of_day": {
+                    "type": "string",
+                    "enum": ["day", "morning", "afternoon", "evening", "night"],
+                    "description": "The part of the day, 'night' for tonight, 'day' for the whole day",
+                },
+            },
+            "required": ["city_name"],
+        },
+    },
+})
+def get_forecast_from_city_name(
+    city_name: str,
+    api_key: str | KeyPool,
+    country: str = None,
+    day_offset: int = 0,
+    part_of_day: str = "day",
+    forecast_cache=None,
+):
+    """
+    Retrieves a compact forecast for a city, day and part of the day.
+
+    Args:
+        city_name (str): The name of the city.
+        api_key (str | KeyPool): The API key for accessing the weather data.
+        country (str, optional): The country code.
+        day_offset (int): Days from today, 0 is today.
+        part_of_day (str): One of "day", "morning", "afternoon", "evening" or "night".
+        forecast_cache (ForecastCache, optional): Cache of the full multi-day forecasts.
+
+    Returns:
+        ForecastData: The forecast for the requested window.
+    """
+    location = f"{city_name},{country}" if country else city_name
+    return _get_forecast(
+        location,
+        api_key=api_key,
+        weather_url=BASE_WEATHER_API,
+        day_offset=max(0, min(int(day_offset), 5)),
+        part_of_day=part_of_day,
+        cache=forecast_cache,
+    )
 
 
 """
@@ -139,13 +262,13 @@ def get_weather_from_city_name_and_state_code_and_country_code(
         },
     },
 })
-def get_weather_image(query: str, api_key: str):
+def get_weather_image(query: str, api_key: str | KeyPool):
     """
     Retrieves weather-related images based on the provided query using the Bing Image Search API.
 
     Args:
         query (str): The query should be in the format of "{weather condition} in {city}, {country code}".
-        api_key (str): The API key for accessing the Bing Image Search API.
+        api_key (str | KeyPool): The API key for accessing the Bing Image Search API.
 
     Returns:
         dict: A dictionary containing a list of image URLs and thumbnail URLs.
@@ -171,19 +294,26 @@ def get_weather_image(query: str, api_key: str):
 
     endpoint = BASE_BING_API + "/images/search"
     params = {"q": query, "imageType": "photo"}
-    header = {"Ocp-Apim-Subscription-Key": api_key}
-    response = _get_api(url=endpoint, params=params, headers=header)
+    response: BingImageResponse = _call_with_key(
+        api_key,
+        lambda key: _get_api(
+            url=endpoint,
+            params=params,
+            headers={"Ocp-Apim-Subscription-Key": key},
+            decode=lambda content: codec.decode(content, BingImageResponse),
+        ),
+    )
 
     if not response:
         raise Exception("Error getting image data")
 
-    if len(response_values := response.get("value", [])) == 0:
+    if len(response.value) == 0:
         raise Exception("No images found")
 
     image_data = {"images": []}
-    for value in response_values:
-        image_url = value.get("contentUrl", None)
-        thumbnail_url = value.get("thumbnailUrl", None)
+    for value in response.value:
+        image_url = value.contentUrl
+        thumbnail_url = value.thumbnailUrl
         if not image_url and not thumbnail_url:
             console.error("Image URL or Thumbnail URL is None")
             continue
@@ -196,3 +326,13 @@ def get_weather_image(query: str, api_key: str):
         )
 
     return image_data
+
+
+available_weather_specs = [
+    Tool.specs["get_weather_from_city_name"],
+    Tool.specs["get_weather_from_city_name_and_country"],
+    Tool.specs["get_weather_from_city_name_and_state_code_and_country_code"],
+    Tool.specs["get_weather_from_coordinates"],
+    Tool.specs["get_forecast_from_city_name"],
+]
+available_image_specs = [Tool.specs["get_weather_image"]]
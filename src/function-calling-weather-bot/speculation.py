@@ -0,0 +1,172 @@
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from function_calling_weather_bot import console, deadline, metrics
+from function_calling_weather_bot.utils import WeatherData
+
+# "in Boise", "for new york", "at Cambridge, MA" -> up to 3 words after the preposition
+LOCATION_PATTERN = re.compile(r"\b(?:in|for|at)\s+")
+WORD_PATTERN = re.compile(r"[A-Za-z][A-Za-z.'-]*")
+MAX_LOCATION_WORDS = 3
+
+# words that end a location e.g. "in Boise right now" or "in Boise and in Seoul"
+STOP_WORDS = {
+    "today", "tonight", "tomorrow", "now", "right", "currently", "like", "look", "looks", "this", "please",
+    "and", "or", "in", "for", "at", "vs", "versus", "compared", "is", "with",
+}
+
+
+def normalize_location(location: str) -> str:
+    return " ".join(location.lower().split())
+
+
+def extract_locations(text: str, max_candidates: int = 2) -> list[str]:
+    """
+    Cheaply guesses the locations mentioned in the user input.
+
+    Args:
+        text (str): The raw user input.
+        max_candidates (int): The maximum number of locations to return.
+
+    Returns:
+        list[str]: Normalized candidate city names in order of appearance.
+    """
+    candidates = []
+    for match in LOCATION_PATTERN.finditer(text):
+        words = []
+        for word in re.split(r"\s+", text[match.end() :]):
+            if not (word_match := WORD_PATTERN.match(word)) or word.lower() in STOP_WORDS:
+                break
+            words.append(word_match.group())
+            # punctuation after the word ends the location e.g. "Boise?" or "Cambridge, MA"
+            if word_match.end() < len(word) or len(words) == MAX_LOCATION_WORDS:
+                break
+
+        if words and words[0].lower() == "the":
+            words = words[1:]
+
+        location = normalize_location(" ".join(words).strip(".'-"))
+        if location and location not in candidates:
+            candidates.append(location)
+        if len(candidates) >= max_candidates:
+            break
+    return candidates
+
+
+class Speculation:
+    """
+    The speculative lookups started for a single turn.
+
+    Use as a context manager so the lookups that weren't claimed are cancelled and counted as misses.
+    """
+
+    def __init__(self, futures: dict[str, Future] = None):
+        self.futures = futures or {}
+        self.claimed: set[str] = set()
+
+    def claim(self, tool_name: str, tool_kwargs: dict) -> WeatherData | None:
+        """
+        Returns the speculative result if it matches the tool call the model made.
+
+        Only city name lookups can be reused, with the country checked against the result if
+        given. State codes can't be checked against the result so those are never reused.
+
+        Args:
+            tool_name (str): The name of the tool the model called.
+            tool_kwargs (dict): The arguments of the tool call.
+
+        Returns:
+            WeatherData | None: The speculative result or None if there is no usable match.
+        """
+        if tool_name not in ("get_weather_from_city_name", "get_weather_from_city_name_and_country"):
+            return None
+
+        location = normalize_location(tool_kwargs.get("city_name", ""))
+        if not (future := self.futures.get(location)):
+            return None
+
+        try:
+            weather_data = future.result()
+        except Exception:
+            return None
+
+        country = tool_kwargs.get("country")
+        if country and country.upper() != weather_data.country_code.upper():
+            return None
+
+        if location not in self.claimed:
+            self.claimed.add(location)
+            metrics.incr("speculation.hits")
+        return weather_data
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        for location, future in self.futures.items():
+            if location not in self.claimed:
+                future.cancel()
+                metrics.incr("speculation.misses")
+
+
+class WeatherSpeculator:
+    """
+    Starts weather lookups for the locations guessed from the user input while the model decides which tool to call.
+
+    Lookups are bounded per turn and by a sliding per-minute budget so wrong guesses can't use
+    up the OpenWeather quota.
+
+    Args:
+        lookup (callable): Function taking `city_name` and returning WeatherData.
+        max_per_turn (int): Maximum number of speculative lookups per turn.
+        max_per_minute (int): Maximum number of speculative lookups in any 60 second window.
+    """
+
+    def __init__(self, lookup: callable, max_per_turn: int = 2, max_per_minute: int = 20):
+        self.lookup = lookup
+        self.max_per_turn = max_per_turn
+        self.max_per_minute = max_per_minute
+        self._executor = ThreadPoolExecutor(max_workers=max_per_turn, thread_name_prefix="speculation")
+        self._lock = threading.Lock()
+        self._started: deque[float] = deque()
+
+    def _acquire(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            while self._started and now - self._started[0] > 60:
+                self._started.popleft()
+            if len(self._started) >= self.max_per_minute:
+                return False
+            self._started.append(now)
+            return True
+
+    def speculate(self, user_input: str) -> Speculation:
+        """
+        Starts the lookups for the locations in the user input.
+
+        Args:
+            user_input (str): The raw user input.
+
+        Returns:
+            Speculation: The lookups started for this turn.
+        """
+        futures = {}
+        for location in extract_locations(user_input, self.max_per_turn):
+            if not self._acquire():
+                metrics.incr("speculation.skipped")
+                continue
+            futures[location] = deadline.submit(self._executor, self.lookup, city_name=location)
+            metrics.incr("speculation.started")
+
+        if futures:
+            console.debug(f"Speculating weather for {list(futures)}")
+        return Speculation(futures)
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of speculative lookups that were used."""
+        started = metrics.count("speculation.started")
+        return metrics.count("speculation.hits") / started if started else 0.0
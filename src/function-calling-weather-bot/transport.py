@@ -0,0 +1,234 @@
+import gzip
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Callable
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httpx
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+# query params that carry credentials, these never make it into a cassette or a match key
+SECRET_PARAMS = {"appid", "api_key", "apikey", "key", "subscription-key", "access_token"}
+
+
+class CassetteMissError(Exception):
+    """Raised when replaying and no recorded exchange matches the request."""
+
+
+def normalize_request(method: str, url: str, body: bytes | str | None = None) -> str:
+    """
+    Builds the key used to match a request against the cassette.
+
+    The query params are sorted and stripped of credentials and JSON bodies are re-encoded
+    with sorted keys so that semantically equal requests produce the same key.
+
+    Args:
+        method (str): The HTTP method.
+        url (str): The full request URL.
+        body (bytes | str, optional): The request body.
+
+    Returns:
+        str: The normalized request key.
+    """
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k.lower() not in SECRET_PARAMS)
+    normalized_url = urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(query), ""))
+
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", errors="replace")
+    if body:
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":"))
+        except ValueError:
+            pass
+
+    return f"{method.upper()} {normalized_url} {body or ''}".rstrip()
+
+
+def recorded_latency(scale: float = 1.0) -> Callable[[dict], float]:
+    """
+    Latency function that replays each exchange with its recorded upstream latency.
+
+    Args:
+        scale (float): Multiplier for the recorded latency.
+    """
+
+    def _latency(entry: dict) -> float:
+        return entry.get("elapsed", 0.0) * scale
+
+    return _latency
+
+
+class Cassette:
+    """
+    A file of recorded upstream exchanges stored as (optionally gzipped) JSON lines.
+
+    In record mode every exchange is appended as it happens. In replay mode requests are
+    matched by `normalize_request`, repeated identical requests are replayed in recorded order
+    and the last match is reused once exhausted.
+
+    Args:
+        path (str | Path): The cassette file, gzipped if it ends with `.gz`.
+        mode (str): Either "record" or "replay".
+        latency (float | Callable[[dict], float]): Seconds to sleep before returning a replayed
+            response, or a function of the recorded entry e.g. `recorded_latency()`.
+    """
+
+    def __init__(self, path: str | Path, mode: str = "replay", latency: float | Callable[[dict], float] = 0.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+
+        self.path = Path(path)
+        self.mode = mode
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._entries: dict[str, deque[dict]] = defaultdict(deque)
+        self._last: dict[str, dict] = {}
+
+        if mode == "replay":
+            self._load()
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._open().close()  # truncate
+
+    def _open(self, mode: str = "wt"):
+        if self.path.suffix == ".gz":
+            return gzip.open(self.path, mode, encoding="utf-8")
+        return open(self.path, mode, encoding="utf-8")
+
+    def _load(self) -> None:
+        with self._open("rt") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[entry["key"]].append(entry)
+
+    def record(self, method: str, url: str, body, status: int, content_type: str, content: bytes, elapsed: float):
+        """Appends an exchange to the cassette."""
+        entry = {
+            "key": normalize_request(method, url, body),
+            "status": status,
+            "content_type": content_type,
+            "body": content.decode("utf-8", errors="replace"),
+            "elapsed": round(elapsed, 4),
+        }
+        with self._lock, self._open("at") as f:
+            f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    def play(self, method: str, url: str, body) -> dict:
+        """
+        Finds the recorded exchange for a request and waits for the configured latency.
+
+        Raises:
+            CassetteMissError: If no exchange matches.
+        """
+        key = normalize_request(method, url, body)
+        with self._lock:
+            if queue := self._entries.get(key):
+                self._last[key] = queue.popleft()
+            if key not in self._last:
+                raise CassetteMissError(f"No recorded exchange for {key[:200]}")
+            entry = self._last[key]
+
+        latency = self.latency(entry) if callable(self.latency) else self.latency
+        if latency > 0:
+            time.sleep(latency)
+        return entry
+
+
+class CassetteAdapter(BaseAdapter):
+    """requests adapter that records through a real HTTPAdapter or replays from a cassette."""
+
+    def __init__(self, cassette: Cassette):
+        super().__init__()
+        self.cassette = cassette
+        self._http = HTTPAdapter()
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        if self.cassette.mode == "record":
+            start = time.perf_counter()
+            response = self._http.send(request, **kwargs)
+            self.cassette.record(
+                request.method,
+                request.url,
+                request.body,
+                response.status_code,
+                response.headers.get("Content-Type", ""),
+                response.content,
+                time.perf_counter() - start,
+            )
+            return response
+
+        entry = self.cassette.play(request.method, request.url, request.body)
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response.reason = "Replayed"
+        response.headers = CaseInsensitiveDict({"Content-Type": entry["content_type"]})
+        response._content = entry["body"].encode("utf-8")
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self) -> None:
+        self._http.close()
+
+
+class CassetteTransport(httpx.BaseTransport):
+    """httpx transport for the OpenAI client that records or replays from a cassette."""
+
+    def __init__(self, cassette: Cassette):
+        self.cassette = cassette
+        self._http = httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        body = request.read()
+        if self.cassette.mode == "record":
+            start = time.perf_counter()
+            response = self._http.handle_request(request)
+            content = response.read()
+            response.close()
+            content_type = response.headers.get("Content-Type", "")
+            self.cassette.record(
+                request.method,
+                str(request.url),
+                body,
+                response.status_code,
+                content_type,
+                content,
+                time.perf_counter() - start,
+            )
+            # content is already decoded so drop the encoding/length headers of the original
+            return httpx.Response(response.status_code, headers={"Content-Type": content_type}, content=content)
+
+        entry = self.cassette.play(request.method, str(request.url), body)
+        return httpx.Response(
+            entry["status"],
+            headers={"Content-Type": entry["content_type"]},
+            content=entry["body"].encode("utf-8"),
+        )
+
+    def close(self) -> None:
+        self._http.close()
+
+
+def install(cassette: Cassette, session: requests.Session) -> httpx.Client:
+    """
+    Routes a requests session through the cassette and returns an httpx client for OpenAI that does the same.
+
+    Args:
+        cassette (Cassette): The cassette to record to or replay from.
+        session (requests.Session): The session used by `utils.get_api`.
+
+    Returns:
+        httpx.Client: A client to pass as `http_client` to `OpenAI`.
+    """
+    adapter = CassetteAdapter(cassette)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return httpx.Client(transport=CassetteTransport(cassette))
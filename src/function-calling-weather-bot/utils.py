@@ -1,39 +1,174 @@
 import json
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from dataclasses import dataclass
 from functools import wraps
 from typing import Sequence
+from urllib.parse import urlsplit
 
 import requests
 
-from function_calling_weather_bot import ICONS
+from function_calling_weather_bot import ICONS, codec, deadline, metrics
+from function_calling_weather_bot.hedging import HedgePolicy, latency_metric
+from function_calling_weather_bot.keypool import KeyPool, KeyPoolExhausted
+from function_calling_weather_bot.codec import OpenWeatherForecastResponse, OpenWeatherResponse
+from function_calling_weather_bot.forecast import ForecastData, LocationForecast
 
+# shared session so upstream calls reuse pooled connections, transports can be mounted on it
+_session = requests.Session()
 
-def get_api(url: str, params: dict, headers: dict = None) -> dict:
+# seconds, used when there is no turn deadline or it is further away
+DEFAULT_TIMEOUT = 10.0
+
+# optional, slow GETs get a duplicate request and the first response wins
+_hedge_policy: HedgePolicy | None = None
+_hedge_executor: ThreadPoolExecutor | None = None
+
+
+def get_session() -> requests.Session:
     """
-    Call either API with the given endpoint and parameters.
-    can be wrapped with @retry
+    Returns the session used by `get_api`.
+
+    Returns:
+        requests.Session: The shared session.
     """
+    return _session
+
+
+def set_hedge_policy(policy: HedgePolicy | None) -> None:
+    """
+    Set when `get_api` sends a duplicate of a slow request, None to never.
+
+    Args:
+        policy (HedgePolicy | None): The hedging policy.
+    """
+    global _hedge_policy, _hedge_executor
+    if _hedge_executor is not None:
+        _hedge_executor.shutdown(wait=False)
+    _hedge_policy = policy
+    _hedge_executor = ThreadPoolExecutor(max_workers=policy.max_workers, thread_name_prefix="hedge") if policy else None
+
 
+def _get(url: str, params: dict, headers: dict, endpoint: str) -> requests.Response:
     # dont print the kwargs ever as contains API key
     requests_kwargs = {
         "url": url,
         "params": params,
+        "timeout": deadline.timeout(DEFAULT_TIMEOUT),
         **({"headers": headers} if headers else {}),
     }
 
-    response = requests.get(**requests_kwargs)
+    started = time.perf_counter()
+    response = _session.get(**requests_kwargs)
+    metrics.observe(latency_metric(endpoint), (time.perf_counter() - started) * 1000)
     response.raise_for_status()
-    return response.json()
+    return response
+
+
+def _hedged_get(url: str, params: dict, headers: dict, endpoint: str) -> requests.Response:
+    policy = _hedge_policy
+    policy.record_request()
+    started = threading.Event()
+
+    def primary_get() -> requests.Response:
+        started.set()
+        return _get(url, params, headers, endpoint)
+
+    primary = deadline.submit(_hedge_executor, primary_get)
+    # the delay counts from when the request goes out, waiting for a free thread is not upstream latency
+    started.wait()
+    try:
+        return primary.result(timeout=policy.delay_for(endpoint))
+    except FutureTimeoutError:
+        pass
+
+    if not policy.acquire():
+        return primary.result()
+
+    hedge = deadline.submit(_hedge_executor, _get, url, params, headers, endpoint)
+    done, _ = wait([primary, hedge], return_when=FIRST_COMPLETED)
+    # prefer whichever succeeded first, only fail if both did
+    first = primary if primary in done else hedge
+    other = hedge if first is primary else primary
+    if first.exception() is not None:
+        first, other = other, first
+    # a request already in flight can't be stopped, its response is dropped and the connection goes back to the pool
+    other.cancel()
+
+    response = first.result()
+    if first is hedge:
+        metrics.incr("hedge.wins")
+    return response
+
+
+def get_api(url: str, params: dict, headers: dict = None, decode: callable = None):
+    """
+    Call either API with the given endpoint and parameters.
+    can be wrapped with @retry
+
+    `decode` takes the raw response body, defaults to `codec.loads`.
+    The request times out at the turn deadline if one is set.
+    If a hedge policy is set a duplicate request is sent when the first is slow, see `set_hedge_policy`.
+    """
+    parts = urlsplit(url)
+    endpoint = parts.netloc + parts.path
+
+    if _hedge_policy is None:
+        response = _get(url, params, headers, endpoint)
+    else:
+        response = _hedged_get(url, params, headers, endpoint)
+    return (decode or codec.loads)(response.content)
+
+
+def call_with_key(api_key: "str | KeyPool", request: callable):
+    """
+    Call `request(key)` with the key, or with a key from the pool if given a KeyPool.
+
+    Lookups answered from a cache never get here, so pool usage and quotas only count upstream requests.
+
+    Args:
+        api_key (str | KeyPool): The API key or the pool to take it from.
+        request (callable): Function making the upstream request with the key.
+
+    Returns:
+        The result of `request`.
+    """
+    if isinstance(api_key, KeyPool):
+        return api_key.call(request)
+    return request(api_key)
+
+
+def _get_current_weather(params: dict, weather_url: str) -> "WeatherData":
+    endpoint = weather_url + "/data/2.5/weather"
+    response: OpenWeatherResponse = get_api(
+        url=endpoint, params=params, decode=lambda content: codec.decode(content, OpenWeatherResponse)
+    )
+
+    if int(response.cod) != 200 or not response.weather:
+        raise Exception("Error getting weather data")
 
+    return WeatherData(
+        description=response.weather[0].description,
+        location=response.name,
+        country_code=response.sys.country,
+        icon=ICONS.get(response.weather[0].icon, ""),
+        temperature=response.main.temp,
+        icon_code=response.weather[0].icon,
+        latitude=response.coord.lat if response.coord else None,
+        longitude=response.coord.lon if response.coord else None,
+    )
 
-def get_weather(location: str, api_key: str, weather_url: str):
+
+def get_weather(location: str, api_key: "str | KeyPool", weather_url: str, cache=None):
     """
     Get the weather data for a specific location.
 
     Args:
         location (str): The location to get the weather for.
-        api_key (str): The API key for accessing the weather data.
+        api_key (str | KeyPool): The API key for accessing the weather data, or the pool to take it from.
+        cache (SpatialWeatherCache, optional): Cache to reuse recent observations from.
 
     Raises:
         Exception: If there is an error getting the weather data.
@@ -41,20 +176,96 @@ def get_weather(location: str, api_key: str, weather_url: str):
     Returns:
         WeatherData: An object containing the weather information for the location.
     """
-    endpoint = weather_url + "/data/2.5/weather"
-    params = {"q": location, "appid": api_key}
-    response = get_api(url=endpoint, params=params)
+    if cache and (weather_data := cache.get_by_name(location)):
+        return weather_data
+
+    try:
+        weather_data = call_with_key(
+            api_key, lambda key: _get_current_weather({"q": location, "appid": key}, weather_url)
+        )
+    except (requests.Timeout, deadline.DeadlineExceeded, KeyPoolExhausted):
+        # better to answer with an older observation than not at all
+        if cache and (weather_data := cache.get_by_name(location, max_age=float("inf"))):
+            metrics.incr("degraded.stale_weather")
+            return weather_data
+        raise
+
+    if cache:
+        cache.put(weather_data, query=location)
+    return weather_data
+
+
+def get_weather_from_coordinates(
+    latitude: float, longitude: float, api_key: "str | KeyPool", weather_url: str, cache=None
+):
+    """
+    Get the weather data for a coordinate.
 
-    if not response or response["cod"] != 200 or len(response) == 0:
-        raise Exception("Error getting weather data")
+    Args:
+        latitude (float): The latitude.
+        longitude (float): The longitude.
+        api_key (str | KeyPool): The API key for accessing the weather data, or the pool to take it from.
+        cache (SpatialWeatherCache, optional): Cache to reuse nearby observations from.
 
-    return WeatherData(
-        description=response["weather"][0]["description"],
-        location=response["name"],
-        country_code=response["sys"]["country"],
-        icon=ICONS.get(response["weather"][0]["icon"], ""),
-        temperature=response["main"]["temp"],
+    Returns:
+        WeatherData: An object containing the weather information for the coordinate.
+    """
+    if cache and (weather_data := cache.get_by_point(latitude, longitude)):
+        return weather_data
+
+    weather_data = call_with_key(
+        api_key, lambda key: _get_current_weather({"lat": latitude, "lon": longitude, "appid": key}, weather_url)
     )
+    if cache:
+        cache.put(weather_data)
+    return weather_data
+
+
+def get_forecast(
+    location: str,
+    api_key: "str | KeyPool",
+    weather_url: str,
+    day_offset: int = 0,
+    part_of_day: str = "day",
+    cache=None,
+) -> ForecastData:
+    """
+    Get the forecast for a location and time window.
+
+    The full 5 day forecast is fetched once per location and kept in `cache`, later questions
+    about any time in it are sliced from memory.
+
+    Args:
+        location (str): The location to get the forecast for.
+        api_key (str | KeyPool): The API key for accessing the weather data, or the pool to take it from.
+        day_offset (int): Days from today, 0 is today.
+        part_of_day (str): One of "day", "morning", "afternoon", "evening" or "night".
+        cache (ForecastCache, optional): Cache of the full forecasts.
+
+    Raises:
+        Exception: If there is an error getting the forecast.
+
+    Returns:
+        ForecastData: The compact forecast for the window.
+    """
+    if not cache or not (forecast := cache.get(location)):
+        endpoint = weather_url + "/data/2.5/forecast"
+        response: OpenWeatherForecastResponse = call_with_key(
+            api_key,
+            lambda key: get_api(
+                url=endpoint,
+                params={"q": location, "appid": key},
+                decode=lambda content: codec.decode(content, OpenWeatherForecastResponse),
+            ),
+        )
+        if int(response.cod) != 200 or not response.list:
+            raise Exception("Error getting forecast data")
+
+        forecast = LocationForecast.from_response(response)
+        if cache:
+            cache.put(location, forecast)
+
+    return forecast.select(day_offset=day_offset, part_of_day=part_of_day)
 
 
 @dataclass
@@ -68,7 +279,10 @@ class WeatherData:
         location (str): The location of the weather data.
         country_code (str): The country code of the location.
         icon (str): The icon representing the weather.
-        temperature (float): The temperature in Celsius.
+        temperature (float): The temperature in Kelvin, OpenWeather's default as no units are requested.
+        icon_code (str): The OpenWeather icon code e.g. "10n".
+        latitude (float): The latitude of the observation, if known.
+        longitude (float): The longitude of the observation, if known.
     """
 
     description: str
@@ -76,6 +290,9 @@ class WeatherData:
     country_code: str
     icon: str
     temperature: float
+    icon_code: str = None
+    latitude: float = None
+    longitude: float = None
 
 
 def retry(
@@ -86,6 +303,7 @@ def retry(
 ) -> callable:
     """
     Decorator function that allows retrying the decorated function in case of exceptions.
+    Doesn't retry once the turn deadline has passed or would pass while waiting, or when no API key is available.
 
     Args:
         max_retries (int): The maximum number of retries.
@@ -107,9 +325,11 @@ def retry(
                     return func(*args, **kwargs)
                 except exceptions as e:
                     retry_count += 1
-                    if retry_count >= max_retries:
+                    if retry_count >= max_retries or isinstance(e, (deadline.DeadlineExceeded, KeyPoolExhausted)):
                         raise e
                     sleep_time = delay * (backoff ** (retry_count - 1))
+                    if (turn_deadline := deadline.current()) and turn_deadline.remaining() <= sleep_time:
+                        raise e
                     time.sleep(sleep_time)
 
         return wrapper
@@ -119,6 +339,7 @@ def retry(
 
 class Tool:
     specs = {}  # Class-level dictionary to store specs
+    _parsed_specs = None  # specs as dicts, parsed on first use
 
     @classmethod
     def spec(cls, spec: str | dict) -> callable:
@@ -133,10 +354,15 @@ class Tool:
             # Store the spec with function's name as key
             wrapper._tool_spec = spec
             cls.specs[func.__name__] = spec
+            cls._parsed_specs = None
             return wrapper
 
         return decorator
 
     @classmethod
-    def get_all_specs(cls):
-        return cls.specs
+    def get_all_specs(cls) -> list[dict]:
+        # specs are stored as json strings, the chat completion api needs the dicts. parsed once as this is
+        # called for every llm call, callers must not modify them
+        if cls._parsed_specs is None:
+            cls._parsed_specs = [json.loads(spec) for spec in cls.specs.values()]
+        return cls._parsed_specs
@@ -0,0 +1,98 @@
+import threading
+import time
+
+from function_calling_weather_bot import console, metrics
+
+
+class Warmer:
+    """
+    Opens connections to the upstreams ahead of the first turn and keeps them open while idle.
+
+    Each target is a name and a cheap request made through the pooled client used for real
+    calls, e.g. a HEAD on the API host, so DNS, TCP and TLS are done before the user's first
+    input and the connection is back in the pool for the first turn. Any response counts, the
+    status code of an unauthenticated request doesn't matter.
+
+    Args:
+        targets (dict[str, callable]): Name of the upstream and the function making the request.
+        keepalive_interval (float | None): Seconds without a turn after which the targets are
+            pinged again so pooled connections are not closed as idle, None to only warm at start.
+    """
+
+    def __init__(self, targets: dict[str, callable], keepalive_interval: float | None = 30.0):
+        self.targets = targets
+        self.keepalive_interval = keepalive_interval
+        self.timings: dict[str, float] = {}
+
+        self._last_used = time.monotonic()
+        self._stop = threading.Event()
+        self._warmed = threading.Event()
+        self._thread = None
+
+    def warm(self) -> dict[str, float]:
+        """
+        Make the request to every target in parallel.
+
+        Returns:
+            dict[str, float]: Milliseconds per target that responded, failures are left out.
+        """
+        timings = {}
+
+        def _warm(name: str, fn: callable) -> None:
+            started = time.perf_counter()
+            try:
+                fn()
+            except Exception as err:
+                console.warn(f"Warm-up of {name} failed: {err}")
+                metrics.incr(f"warmup.{name}.failed")
+                return
+            timings[name] = (time.perf_counter() - started) * 1000
+            metrics.observe(f"warmup.{name}.ms", timings[name])
+
+        threads = [
+            threading.Thread(target=_warm, args=(name, fn), name=f"warmup-{name}", daemon=True)
+            for name, fn in self.targets.items()
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.timings.update(timings)
+        return timings
+
+    def touch(self) -> None:
+        """Note that the connections were just used by a turn, resets the keep-alive timer."""
+        self._last_used = time.monotonic()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Wait for the initial warm-up, returns False if it is still running after `timeout`."""
+        return self._warmed.wait(timeout)
+
+    def start(self) -> None:
+        """Warm up in a background thread, then keep the connections alive until `stop`."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        timings = self.warm()
+        self._warmed.set()
+        console.info(
+            "Warmed up " + ", ".join(f"{name} in {ms:.0f}ms" for name, ms in timings.items())
+            if timings
+            else "Warm-up failed for every upstream"
+        )
+
+        if not self.keepalive_interval:
+            return
+        self.touch()
+        while not self._stop.wait(self.keepalive_interval / 2):
+            if time.monotonic() - self._last_used >= self.keepalive_interval:
+                self.warm()
+                metrics.incr("warmup.keepalive")
+                self.touch()
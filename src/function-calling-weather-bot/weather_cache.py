@@ -0,0 +1,101 @@
+import threading
+import time
+
+from function_calling_weather_bot import geohash, metrics
+from function_calling_weather_bot.utils import WeatherData
+
+
+def normalize_query(query: str) -> str:
+    return ",".join(part.strip() for part in query.lower().split(","))
+
+
+class SpatialWeatherCache:
+    """
+    Weather observations indexed by geohash cell.
+
+    A lookup for a point reuses any fresh observation in the same or a neighboring cell, so at
+    the default precision of 5 (cells of roughly 5km x 5km) nearby suburbs share one upstream
+    call. City name queries are mapped to the cell of their result so name and coordinate
+    lookups share the same index.
+
+    Args:
+        precision (int): Geohash precision of the cells.
+        ttl (float): Seconds an observation stays fresh.
+        max_entries (int): Maximum number of cells kept, the oldest observations are dropped first.
+    """
+
+    def __init__(self, precision: int = 5, ttl: float = 600, max_entries: int = 10_000):
+        self.precision = precision
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._cells: dict[str, tuple[float, WeatherData]] = {}  # geohash -> (time observed, weather)
+        self._names: dict[str, str] = {}  # normalized query -> geohash
+
+    def _fresh(self, cell: str, now: float, max_age: float = None) -> WeatherData | None:
+        # needs to be called with the lock held
+        if (entry := self._cells.get(cell)) and now - entry[0] <= (self.ttl if max_age is None else max_age):
+            return entry[1]
+        return None
+
+    def _record(self, weather_data: WeatherData | None) -> WeatherData | None:
+        metrics.incr("weather_cache.hits" if weather_data else "weather_cache.misses")
+        return weather_data
+
+    def get_by_point(self, latitude: float, longitude: float) -> WeatherData | None:
+        """
+        Get a fresh observation in the cell of the point or one of its neighbors.
+
+        Args:
+            latitude (float): The latitude.
+            longitude (float): The longitude.
+
+        Returns:
+            WeatherData | None: The cached weather or None.
+        """
+        cell = geohash.encode(latitude, longitude, self.precision)
+        now = time.monotonic()
+        with self._lock:
+            for candidate in [cell, *geohash.neighbors(cell)]:
+                if weather_data := self._fresh(candidate, now):
+                    return self._record(weather_data)
+        return self._record(None)
+
+    def get_by_name(self, query: str, max_age: float = None) -> WeatherData | None:
+        """
+        Get a fresh observation for a location query that was looked up before.
+
+        Args:
+            query (str): The OpenWeather location query e.g. "Boise,ID,US".
+            max_age (float, optional): Override the ttl e.g. to fall back to stale observations.
+
+        Returns:
+            WeatherData | None: The cached weather or None.
+        """
+        with self._lock:
+            if cell := self._names.get(normalize_query(query)):
+                return self._record(self._fresh(cell, time.monotonic(), max_age))
+        return self._record(None)
+
+    def put(self, weather_data: WeatherData, query: str = None) -> None:
+        """
+        Add an observation, it needs coordinates to be indexed.
+
+        Args:
+            weather_data (WeatherData): The observation.
+            query (str, optional): The location query it was looked up with.
+        """
+        if weather_data.latitude is None or weather_data.longitude is None:
+            return
+
+        cell = geohash.encode(weather_data.latitude, weather_data.longitude, self.precision)
+        with self._lock:
+            self._cells.pop(cell, None)
+            self._cells[cell] = (time.monotonic(), weather_data)
+            if query:
+                self._names[normalize_query(query)] = cell
+
+            while len(self._cells) > self.max_entries:
+                self._cells.pop(next(iter(self._cells)))
+            while len(self._names) > self.max_entries:
+                self._names.pop(next(iter(self._names)))
@@ -0,0 +1,53 @@
+import json
+import unittest
+
+from function_calling_weather_bot import ICONS, codec
+from function_calling_weather_bot.codec import BingImageResponse, OpenWeatherResponse
+from function_calling_weather_bot.utils import WeatherData
+
+OPEN_WEATHER_BODY = json.dumps(
+    {
+        "weather": [{"id": 800, "description": "clear sky", "icon": "01d"}],
+        "main": {"temp": 291.5, "humidity": 45},
+        "sys": {"country": "US"},
+        "name": "Boise",
+        "cod": 200,
+    }
+).encode()
+
+BING_BODY = json.dumps({"value": [{"contentUrl": "https://a/1.jpg", "thumbnailUrl": None, "width": 10}]}).encode()
+
+
+class TestCodec(unittest.TestCase):
+    def tearDown(self):
+        codec.set_backend(codec._default_backend())
+
+    def test_backends_agree(self):
+        results = []
+        for backend in codec.BACKENDS:
+            try:
+                codec.set_backend(backend)
+            except ValueError:
+                continue
+            weather = codec.decode(OPEN_WEATHER_BODY, OpenWeatherResponse)
+            images = codec.decode(BING_BODY, BingImageResponse)
+            encoded = codec.dumps(WeatherData("clear sky", weather.name, weather.sys.country, "", weather.main.temp))
+            results.append((weather, images, json.loads(encoded)))
+
+        assert results[0][0].weather[0].icon == "01d"
+        assert results[0][1].value[0].thumbnailUrl is None
+        assert results[0][2]["location"] == "Boise"
+        assert all(result == results[0] for result in results)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            codec.set_backend("yaml")
+
+    def test_icons_encode(self):
+        for backend in codec.BACKENDS:
+            try:
+                codec.set_backend(backend)
+            except ValueError:
+                continue
+            for icon in ICONS.values():
+                assert json.loads(codec.dumps(WeatherData("", "", "", icon, 0.0)))["icon"] == icon
@@ -0,0 +1,32 @@
+import io
+import json
+import unittest
+
+from function_calling_weather_bot import console
+from function_calling_weather_bot.console import LogLevel
+
+
+class TestConsole(unittest.TestCase):
+    def tearDown(self):
+        console.set_backend("rich")
+        console.setLEVEL(LogLevel.INFO)
+
+    def test_levels(self):
+        assert LogLevel.DEBUG <= LogLevel.INFO
+        assert LogLevel.ERROR <= LogLevel.ERROR
+        assert not LogLevel.CRITICAL <= LogLevel.WARNING
+
+    def test_jsonl(self):
+        stream = io.StringIO()
+        console.set_backend("jsonl", stream=stream)
+        console.setLEVEL(LogLevel.WARNING)
+        console.info("hidden")
+        with console.trace("abc123"):
+            console.warn("slow upstream")
+        console.error("failed")
+        console.set_backend("rich")
+
+        records = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert [record["msg"] for record in records] == ["slow upstream", "failed"]
+        assert records[0]["level"] == "warning" and records[0]["trace_id"] == "abc123"
+        assert "trace_id" not in records[1]
@@ -0,0 +1,188 @@
+import json
+import time
+import unittest
+from types import SimpleNamespace
+
+import requests
+
+from function_calling_weather_bot import metrics
+from function_calling_weather_bot.conversation_handler import APOLOGY, ConversationHandler, format_temperature
+from function_calling_weather_bot.keypool import KeyPoolExhausted
+from function_calling_weather_bot.routing import PHRASING, ModelRouter
+from function_calling_weather_bot.utils import Tool, WeatherData
+
+
+def completion(content: str = None, tool_calls: list = None) -> SimpleNamespace:
+    message = SimpleNamespace(role="assistant", content=content, tool_calls=tool_calls)
+    usage = SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+def tool_call(city_name: str) -> SimpleNamespace:
+    function = SimpleNamespace(name="get_weather_from_city_name", arguments=json.dumps({"city_name": city_name}))
+    return SimpleNamespace(id=f"call_{city_name}", type="function", function=function)
+
+
+def make_handler(cities: list[str], image_delays: dict[str, float], **kwargs) -> ConversationHandler:
+    """A handler whose model asks for the weather in `cities` and whose image search takes `image_delays`."""
+    handler = ConversationHandler("weather-key", "openai-key", "bing-key", **kwargs)
+
+    def create(**kwargs):
+        if any(isinstance(m, dict) and m.get("role") == "tool" for m in kwargs["messages"]):
+            return completion(content="Here you go")
+        return completion(tool_calls=[tool_call(city) for city in cities])
+
+    def get_image_for_weather(weather_data: WeatherData) -> str:
+        time.sleep(image_delays.get(weather_data.location, 0))
+        return f"https://images.example/{weather_data.location}.jpg"
+
+    handler.llm_handler.client.chat.completions.create = create
+    handler.services.weather_funcs["get_weather_from_city_name"] = lambda city_name: WeatherData(
+        "clear sky", city_name, "US", "", 280.0
+    )
+    handler.get_image_for_weather = get_image_for_weather
+    return handler
+
+
+class TestImageJoin(unittest.TestCase):
+    def test_image_appended(self):
+        handler = make_handler(["Boise"], {})
+        assert handler.process_input("weather in Boise") == "Here you go\n https://images.example/Boise.jpg"
+
+    def test_slow_image_dropped(self):
+        handler = make_handler(["Boise"], {"Boise": 0.5}, image_timeout=0.05)
+        dropped = metrics.count("degraded.image_dropped")
+
+        started = time.perf_counter()
+        assert handler.process_input("weather in Boise") == "Here you go"
+        assert time.perf_counter() - started < 0.4
+        assert metrics.count("degraded.image_dropped") == dropped + 1
+
+    def test_failed_search_dropped(self):
+        handler = make_handler(["Boise"], {})
+        del handler.get_image_for_weather
+
+        def get_weather_image(query: str) -> dict:
+            raise requests.Timeout("image search timed out")
+
+        handler.services.bing_funcs["get_weather_image"] = get_weather_image
+        dropped = metrics.count("degraded.image_dropped")
+
+        assert handler.process_input("weather in Boise") == "Here you go"
+        assert metrics.count("degraded.image_dropped") == dropped + 1
+
+    def test_images_in_tool_call_order(self):
+        handler = make_handler(["Boise", "Paris"], {"Boise": 0.1})
+        assert handler.process_input("weather in Boise and in Paris").splitlines()[1:] == [
+            " https://images.example/Boise.jpg",
+            " https://images.example/Paris.jpg",
+        ]
+
+
+class TestToolSpecs(unittest.TestCase):
+    def test_parsed_once(self):
+        specs = Tool.get_all_specs()
+        assert [spec["function"]["name"] for spec in specs] == list(Tool.specs)
+        assert Tool.get_all_specs() is specs
+
+
+class TestKeys(unittest.TestCase):
+    def test_missing_openai_key(self):
+        with self.assertRaisesRegex(ValueError, "OPENAI_API_KEY"):
+            ConversationHandler("weather-key", None, "bing-key")
+
+
+class TestStages(unittest.TestCase):
+    def test_answer_without_tools_is_not_phrased_again(self):
+        handler = make_handler([], {}, router=ModelRouter("big", {PHRASING: "small"}, escalation_model="big"))
+        models = []
+
+        def create(model: str, **kwargs):
+            models.append(model)
+            return completion(content=f"answer from {model}")
+
+        handler.llm_handler.client.chat.completions.create = create
+        assert handler.process_input("Should I bring a jacket?") == "answer from big"
+        assert models == ["big"]
+        assert handler.llm_handler.messages[-1] == {"role": "assistant", "content": "answer from big"}
+
+    def test_tool_results_are_phrased(self):
+        handler = make_handler([], {}, router=ModelRouter("big", {PHRASING: "small"}))
+        models = []
+
+        def create(model: str, messages: list, **kwargs):
+            models.append(model)
+            if any(isinstance(m, dict) and m.get("role") == "tool" for m in messages):
+                return completion(content=f"answer from {model}")
+            return completion(tool_calls=[tool_call("Boise")])
+
+        handler.llm_handler.client.chat.completions.create = create
+        assert handler.process_input("weather in Boise").splitlines()[0] == "answer from small"
+        assert models == ["big", "small"]
+
+    def test_phrasing_without_text_is_templated(self):
+        handler = make_handler(["Boise"], {})
+        tool_choices = []
+
+        def create(tool_choice: str, **kwargs):
+            # the phrasing model calls the tool again instead of answering
+            tool_choices.append(tool_choice)
+            return completion(tool_calls=[tool_call("Boise")])
+
+        handler.llm_handler.client.chat.completions.create = create
+        templated = metrics.count("degraded.templated_response")
+
+        response = handler.process_input("weather in Boise")
+        assert tool_choices == ["auto", "none"]
+        assert response.startswith("It's currently clear sky and 44°F in Boise, US.")
+        assert response.endswith("\n https://images.example/Boise.jpg")
+        assert metrics.count("degraded.templated_response") == templated + 1
+
+
+class TestDescribe(unittest.TestCase):
+    def test_format_temperature(self):
+        assert format_temperature(291.5, "US") == "65°F"
+        assert format_temperature(291.5, "FR") == "18°C"
+        assert format_temperature(273.15) == "0°C"
+
+    def test_templated_text(self):
+        weather_data = WeatherData("clear sky", "Paris", "FR", "☀️", 291.5)
+        assert ConversationHandler._describe(weather_data) == "☀️ It's currently clear sky and 18°C in Paris, FR."
+
+
+class TestToolFailure(unittest.TestCase):
+    def test_unfinished_tool_call_dropped(self):
+        handler = make_handler([], {})
+
+        def create(messages: list, tools: list = None, **kwargs):
+            # like the api, reject tool calls that are not answered by tool messages
+            for i, message in enumerate(messages):
+                for call in getattr(message, "tool_calls", None) or []:
+                    assert any(isinstance(m, dict) and m.get("tool_call_id") == call.id for m in messages[i + 1 :])
+            last = messages[-1]
+            if tools and isinstance(last, dict) and last["role"] == "user":
+                return completion(tool_calls=[tool_call(last["content"].split()[-1])])
+            return completion(content="Here you go")
+
+        def get_weather(city_name: str) -> WeatherData:
+            if city_name == "Atlantis":
+                raise Exception("city not found")
+            return WeatherData("clear sky", city_name, "US", "", 280.0)
+
+        handler.llm_handler.client.chat.completions.create = create
+        handler.services.weather_funcs["get_weather_from_city_name"] = get_weather
+
+        assert handler.process_input("weather in Atlantis") == "Here you go"
+        assert not any(getattr(m, "tool_calls", None) for m in handler.llm_handler.messages)
+        assert handler.process_input("weather in Boise") == "Here you go\n https://images.example/Boise.jpg"
+
+
+class TestDegrade(unittest.TestCase):
+    def test_no_key_available(self):
+        handler = make_handler(["Boise"], {})
+
+        def create(**kwargs):
+            raise KeyPoolExhausted("No openai API key available")
+
+        handler.llm_handler.client.chat.completions.create = create
+        assert handler.process_input("weather in Boise") == APOLOGY
@@ -0,0 +1,36 @@
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from function_calling_weather_bot import deadline
+from function_calling_weather_bot.utils import retry
+
+
+class TestDeadline(unittest.TestCase):
+    def test_timeout(self):
+        assert deadline.timeout(10.0) == 10.0
+        with deadline.deadline(0.5):
+            assert deadline.timeout(10.0) <= 0.5
+            assert deadline.timeout(0.1) == 0.1
+        with deadline.deadline(0):
+            with self.assertRaises(deadline.DeadlineExceeded):
+                deadline.timeout(10.0)
+
+    def test_submit_propagates(self):
+        with ThreadPoolExecutor(1) as executor, deadline.deadline(5):
+            assert deadline.submit(executor, deadline.current).result() is deadline.current()
+            assert executor.submit(deadline.current).result() is None
+
+    def test_retry_stops_at_deadline(self):
+        calls = []
+
+        @retry(max_retries=3, delay=1)
+        def flaky():
+            calls.append(1)
+            raise ValueError("upstream error")
+
+        start = time.monotonic()
+        with deadline.deadline(0.5), self.assertRaises(ValueError):
+            flaky()
+        assert len(calls) == 1
+        assert time.monotonic() - start < 0.5
@@ -0,0 +1,55 @@
+import unittest
+from datetime import datetime, timezone
+
+from function_calling_weather_bot import codec
+from function_calling_weather_bot.codec import OpenWeatherForecastResponse
+from function_calling_weather_bot.forecast import ForecastCache, LocationForecast
+
+# midnight UTC, the forecast city is in UTC-6
+START = int(datetime(2024, 5, 24, tzinfo=timezone.utc).timestamp())
+NOW = START + 18 * 3600  # noon local time
+
+
+def _forecast_response() -> OpenWeatherForecastResponse:
+    return OpenWeatherForecastResponse.from_dict(
+        {
+            "cod": "200",
+            "list": [
+                {
+                    "dt": START + i * 3 * 3600,
+                    "main": {"temp": 280.0 + i},
+                    "weather": [{"description": "clear sky", "icon": "01d"}],
+                    "pop": 0.1,
+                }
+                for i in range(40)
+            ],
+            "city": {"name": "Boise", "country": "US", "timezone": -6 * 3600},
+        }
+    )
+
+
+class TestForecast(unittest.TestCase):
+    def test_select(self):
+        forecast = LocationForecast.from_response(_forecast_response())
+
+        tonight = forecast.select(day_offset=0, part_of_day="night", now=NOW)
+        assert tonight.date == "2024-05-24"
+        # 21:00 local to 06:00 local is 03:00 to 12:00 UTC on the 25th
+        assert [slot.time for slot in tonight.slots] == ["Fri 21:00", "Sat 00:00", "Sat 03:00"]
+
+        tomorrow = forecast.select(day_offset=1, now=NOW, max_slots=4)
+        assert tomorrow.date == "2024-05-25"
+        assert len(tomorrow.slots) == 4
+        assert tomorrow.temperature_max - tomorrow.temperature_min == 7
+
+        assert forecast.select(day_offset=10, now=NOW).slots == []
+
+    def test_cache_and_payload_size(self):
+        cache = ForecastCache(ttl=60)
+        forecast = LocationForecast.from_response(_forecast_response())
+        cache.put("Boise", forecast)
+        assert cache.get("boise") is forecast
+        assert cache.get("Seoul") is None
+
+        payload = codec.dumps(forecast.select(day_offset=1, now=NOW))
+        assert len(payload) < 1000
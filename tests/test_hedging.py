@@ -0,0 +1,73 @@
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from function_calling_weather_bot import metrics, utils
+from function_calling_weather_bot.hedging import HedgePolicy
+
+
+class SlowSession:
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def get(self, url, params, timeout, headers=None):
+        time.sleep(self.delay)
+        return SimpleNamespace(content=b"{}", raise_for_status=lambda: None)
+
+
+class SlowFirstSession:
+    def __init__(self, first_delay: float):
+        self.first_delay = first_delay
+        self.calls = 0
+
+    def get(self, url, params, timeout, headers=None):
+        self.calls += 1
+        time.sleep(self.first_delay if self.calls == 1 else 0)
+        return SimpleNamespace(content=b'{"call": %d}' % self.calls, raise_for_status=lambda: None)
+
+
+class TestHedging(unittest.TestCase):
+    def tearDown(self):
+        utils.set_hedge_policy(None)
+
+    def test_hedge_wins(self):
+        metrics.reset()
+        utils.set_hedge_policy(HedgePolicy(delay=0.05, max_ratio=1.0))
+        with patch.object(utils, "_session", SlowFirstSession(first_delay=0.5)) as session:
+            started = time.perf_counter()
+            assert utils.get_api("https://example.com/data", params={}) == {"call": 2}
+            assert time.perf_counter() - started < 0.4
+        assert session.calls == 2
+        assert metrics.count("hedge.wins") == 1
+
+    def test_budget(self):
+        metrics.reset()
+        utils.set_hedge_policy(HedgePolicy(delay=0.01, max_ratio=0.0))
+        with patch.object(utils, "_session", SlowFirstSession(first_delay=0.05)) as session:
+            assert utils.get_api("https://example.com/data", params={}) == {"call": 1}
+        assert session.calls == 1
+        assert metrics.count("hedge.over_budget") == 1
+
+    def test_live_delay(self):
+        metrics.reset()
+        policy = HedgePolicy(min_samples=3, default_delay=1.0)
+        assert policy.delay_for("example.com/data") == 1.0
+        for ms in (10, 20, 30, 400):
+            metrics.observe("upstream.example.com/data.latency_ms", ms)
+        assert policy.delay_for("example.com/data") == 0.4
+
+    def test_queueing_is_not_latency(self):
+        metrics.reset()
+        utils.set_hedge_policy(HedgePolicy(delay=0.15, max_ratio=1.0, burst=10, max_workers=2))
+        with patch.object(utils, "_session", SlowSession(0.1)), ThreadPoolExecutor(max_workers=4) as callers:
+            list(callers.map(lambda _: utils.get_api("https://example.com/data", params={}), range(4)))
+        assert metrics.count("hedge.sent") == 0
+
+    def test_concurrent_requests(self):
+        utils.set_hedge_policy(HedgePolicy(delay=1.0))
+        with patch.object(utils, "_session", SlowSession(0.2)), ThreadPoolExecutor(max_workers=24) as callers:
+            started = time.perf_counter()
+            list(callers.map(lambda _: utils.get_api("https://example.com/data", params={}), range(24)))
+            assert time.perf_counter() - started < 0.4
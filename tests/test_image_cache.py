@@ -0,0 +1,64 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import requests
+
+from function_calling_weather_bot.image_cache import ImageCache
+
+
+class TestImageCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = ImageCache(self.tmp_dir.name, max_bytes=10)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp_dir.cleanup()
+
+    def test_store_is_content_addressed(self):
+        url_a = self.cache.store("https://a.example/1.jpg", b"abc", "image/jpeg")
+        url_b = self.cache.store("https://b.example/2.jpg", b"abc", "image/jpeg")
+        assert url_a == url_b
+        assert len(list(Path(self.tmp_dir.name).iterdir())) == 1
+        assert self.cache.get("https://b.example/2.jpg") == url_a
+
+    def test_lru_eviction(self):
+        self.cache.store("https://a.example/1.jpg", b"11111", "image/jpeg")
+        self.cache.store("https://a.example/2.jpg", b"22222", "image/jpeg")
+        # touch the first so the second is evicted
+        assert self.cache.get("https://a.example/1.jpg")
+        self.cache.store("https://a.example/3.jpg", b"33333", "image/jpeg")
+
+        assert self.cache.get("https://a.example/1.jpg")
+        assert self.cache.get("https://a.example/2.jpg") is None
+        assert self.cache.get("https://a.example/3.jpg")
+
+    def test_dead_link_skipped(self):
+        assert self.cache.store("https://a.example/page.html", b"<html>", "text/html") is None
+
+        def response(status: int, content_type: str = "image/jpeg") -> requests.Response:
+            response = requests.Response()
+            response.status_code = status
+            response._content = b"x"
+            response.headers["Content-Type"] = content_type
+            return response
+
+        with patch.object(self.cache._session, "get", return_value=response(503)):
+            assert self.cache.fetch("https://a.example/busy.jpg") is None
+        with patch.object(self.cache._session, "get", return_value=response(404)):
+            assert self.cache.fetch("https://a.example/gone.jpg") is None
+        with patch.object(self.cache._session, "get", return_value=response(200, "text/html")):
+            assert self.cache.fetch("https://a.example/page.html") is None
+        assert list(self.cache._dead_urls) == ["https://a.example/gone.jpg", "https://a.example/page.html"]
+
+        # transient failures are retried, dead urls skipped until they expire
+        with patch.object(self.cache._session, "get", return_value=response(200)) as get:
+            assert self.cache.fetch("https://a.example/busy.jpg")
+            assert self.cache.fetch("https://a.example/gone.jpg") is None
+            assert get.call_count == 1
+
+        self.cache.max_dead_urls = 1
+        self.cache._mark_dead("https://a.example/other.jpg")
+        assert list(self.cache._dead_urls) == ["https://a.example/other.jpg"]
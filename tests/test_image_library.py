@@ -0,0 +1,21 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from function_calling_weather_bot.image_library import ImageLibrary
+
+
+class TestImageLibrary(unittest.TestCase):
+    def test_select(self):
+        library = ImageLibrary({"01d": ["https://a/clear.jpg"], "01d:CA": ["https://a/clear-ca.jpg"], "10n": []})
+        assert library.select("01d", "US") == "https://a/clear.jpg"
+        assert library.select("01d", "CA") == "https://a/clear-ca.jpg"
+        assert library.select("10n", "US") is None
+        assert library.select(None) is None
+
+    def test_save_and_load(self):
+        library = ImageLibrary({"01d": ["https://a/clear.jpg"]})
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "library.json"
+            library.save(path)
+            assert ImageLibrary.load(path).select("01d") == "https://a/clear.jpg"
@@ -0,0 +1,90 @@
+import json
+import unittest
+from collections import Counter
+from unittest.mock import patch
+
+from function_calling_weather_bot import utils
+from function_calling_weather_bot.keypool import KeyPool, KeyPoolExhausted, key_id
+from function_calling_weather_bot.services import Services
+from function_calling_weather_bot.weather_cache import SpatialWeatherCache
+
+
+class _RateLimited(Exception):
+    status_code = 429
+
+
+class _Unauthorized(Exception):
+    status_code = 401
+
+
+class TestKeyPool(unittest.TestCase):
+    def test_weighted_round_robin(self):
+        pool = KeyPool.from_keys("a:2,b,c")
+        picks = Counter(pool.acquire() for _ in range(40))
+        assert picks == {"a": 20, "b": 10, "c": 10}
+
+    def test_least_used_and_quota(self):
+        pool = KeyPool(["a", "b"], strategy="least_used", quota=2)
+        assert sorted(pool.acquire() for _ in range(4)) == ["a", "a", "b", "b"]
+        with self.assertRaises(KeyPoolExhausted):
+            pool.acquire()
+
+    def test_rate_limited_key_removed(self):
+        pool = KeyPool(["a", "b"])
+
+        def request(key):
+            if key == "a":
+                raise _RateLimited()
+            return key
+
+        assert [pool.call(request) for _ in range(3)] == ["b", "b", "b"]
+        stats = pool.stats()
+        assert stats[key_id("a")]["available"] is False
+        assert "a" not in stats and "b" not in stats
+
+    def test_last_key_backs_off(self):
+        pool = KeyPool(["a"], backoff=0.01)
+        calls = []
+
+        def request(key):
+            calls.append(key)
+            if len(calls) == 1:
+                raise _RateLimited()
+            return key
+
+        assert pool.call(request) == "a"
+        assert pool.stats()[key_id("a")]["available"] is True
+
+        def rejected(key):
+            raise _Unauthorized()
+
+        # not retried and the only key stays in rotation for the next request
+        with self.assertRaises(_Unauthorized):
+            pool.call(rejected)
+        assert pool.call(request) == "a"
+
+
+class TestServiceKeys(unittest.TestCase):
+    def test_cache_hits_use_no_key(self):
+        body = json.dumps(
+            {
+                "coord": {"lat": 43.6135, "lon": -116.2035},
+                "weather": [{"description": "clear sky", "icon": "01d"}],
+                "main": {"temp": 291.5},
+                "sys": {"country": "US"},
+                "name": "Boise",
+                "cod": 200,
+            }
+        ).encode()
+        weather_keys = KeyPool(["a"], quota=1)
+        cache = SpatialWeatherCache(ttl=60)
+        services = Services(weather_api_key=weather_keys, bing_api_key="b", weather_cache=cache)
+
+        with patch.object(utils, "get_api", lambda url, params, decode: decode(body)):
+            for _ in range(3):
+                assert services.weather_funcs["get_weather_from_city_name"](city_name="Boise").location == "Boise"
+        assert weather_keys.stats()[key_id("a")]["used"] == 1
+
+        # out of quota, an expired observation is still better than no answer
+        cache.ttl = 0
+        assert services.weather_funcs["get_weather_from_city_name"](city_name="Boise").location == "Boise"
@@ -0,0 +1,45 @@
+import pstats
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from function_calling_weather_bot import deadline
+
+from function_calling_weather_bot.profiling import TurnProfiler, summarize
+
+
+class TestTurnProfiler(unittest.TestCase):
+    def test_every_n(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            profiler = TurnProfiler(tmp_dir, every_n=2)
+            for turn in range(4):
+                with profiler.profile_turn(f"trace{turn}"):
+                    sum(range(1000))
+
+            files = sorted(Path(tmp_dir).glob("*.prof"))
+            assert [f.name for f in files] == ["turn-00002-trace1.prof", "turn-00004-trace3.prof"]
+            assert "Aggregated 2 turns" in summarize([tmp_dir])
+
+    def test_threshold(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            profiler = TurnProfiler(tmp_dir, every_n=0, threshold_ms=20)
+            with profiler.profile_turn("fast"):
+                pass
+            with profiler.profile_turn("slow"):
+                time.sleep(0.03)
+
+            assert [f.name for f in Path(tmp_dir).glob("*.prof")] == ["turn-00002-slow.prof"]
+
+    def test_worker_threads(self):
+        def image_search():
+            return sum(range(1000))
+
+        with tempfile.TemporaryDirectory() as tmp_dir, ThreadPoolExecutor(max_workers=1) as executor:
+            profiler = TurnProfiler(tmp_dir)
+            with profiler.profile_turn("trace"):
+                deadline.submit(executor, image_search).result()
+
+            (file,) = Path(tmp_dir).glob("*.prof")
+            assert any(name == "image_search" for _, _, name in pstats.Stats(str(file)).stats)
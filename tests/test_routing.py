@@ -0,0 +1,28 @@
+import unittest
+
+from function_calling_weather_bot.routing import ERROR, PHRASING, TOOL_SELECTION, ModelRouter
+
+
+class TestModelRouter(unittest.TestCase):
+    def test_default_is_single_model(self):
+        router = ModelRouter(default_model="gpt-4o")
+        assert all(router.model_for(stage, escalate=True) == "gpt-4o" for stage in (TOOL_SELECTION, PHRASING, ERROR))
+        assert not router.should_escalate(TOOL_SELECTION, user_input="weather in Boise and in Seoul")
+
+    def test_escalation(self):
+        router = ModelRouter(
+            default_model="small",
+            models={PHRASING: "small", ERROR: "small"},
+            escalation_model="big",
+        )
+        assert not router.should_escalate(TOOL_SELECTION, user_input="weather in Boise?")
+        assert router.should_escalate(TOOL_SELECTION, user_input="weather in Boise and in Seoul")
+        assert router.should_escalate(TOOL_SELECTION, user_input="and tomorrow?")
+        assert router.should_escalate(PHRASING, tool_calls=[1, 2])
+        assert not router.should_escalate(ERROR)
+        assert router.model_for(PHRASING, escalate=True) == "big"
+        assert router.model_for(ERROR) == "small"
+
+    def test_unknown_stage(self):
+        with self.assertRaises(ValueError):
+            ModelRouter(models={"summary": "small"})
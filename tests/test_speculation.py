@@ -0,0 +1,34 @@
+import unittest
+
+from function_calling_weather_bot.speculation import WeatherSpeculator, extract_locations
+from function_calling_weather_bot.utils import WeatherData
+
+
+class TestSpeculation(unittest.TestCase):
+    def test_extract_locations(self):
+        assert extract_locations("Show me what the weather in Vancouver looks like right now.") == ["vancouver"]
+        assert extract_locations("weather for new york today and in Seoul?") == ["new york", "seoul"]
+        assert extract_locations("hello there") == []
+
+    def test_claim(self):
+        lookups = []
+
+        def lookup(city_name: str):
+            lookups.append(city_name)
+            return WeatherData("clear sky", city_name.title(), "CA", "", 280.0)
+
+        speculator = WeatherSpeculator(lookup, max_per_turn=2, max_per_minute=2)
+        with speculator.speculate("weather in Vancouver") as speculation:
+            assert speculation.claim("get_weather_from_city_name", {"city_name": "Vancouver"}).location == "Vancouver"
+            assert speculation.claim("get_weather_from_city_name_and_country", {"city_name": "vancouver", "country": "US"}) is None
+
+        with speculator.speculate("in Boise") as speculation:
+            assert speculation.claim("get_weather_from_city_name", {"city_name": "Seoul"}) is None
+
+        # per minute budget is used up
+        with speculator.speculate("in Seoul") as speculation:
+            assert speculation.futures == {}
+
+        # the boise lookup may have been cancelled before it ran
+        assert lookups[0] == "vancouver"
+        assert "seoul" not in lookups
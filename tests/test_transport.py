@@ -0,0 +1,72 @@
+import json
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import httpx
+import requests
+
+from function_calling_weather_bot.transport import Cassette, CassetteMissError, install, normalize_request
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = json.dumps({"path": self.path}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestTransport(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name) / "cassette.jsonl.gz"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_normalize_request(self):
+        key_a = normalize_request("get", "https://API.example.com/w?q=Boise&appid=secret&units=metric")
+        key_b = normalize_request("GET", "https://api.example.com/w?units=metric&q=Boise&appid=other")
+        assert key_a == key_b
+        assert "secret" not in key_a
+        assert normalize_request("POST", "https://a/b", b'{"b": 1, "a": 2}') == 'POST https://a/b {"a":2,"b":1}'
+
+    def test_record_then_replay(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}/data"
+
+        session = requests.Session()
+        install(Cassette(self.path, mode="record"), session)
+        recorded = session.get(url, params={"q": "Boise", "appid": "secret"}).json()
+        server.shutdown()
+        server.server_close()
+
+        session = requests.Session()
+        http_client = install(Cassette(self.path, mode="replay"), session)
+        replayed = session.get(url, params={"appid": "another", "q": "Boise"})
+        assert replayed.json() == recorded
+        replayed.raise_for_status()
+
+        with self.assertRaises(CassetteMissError):
+            session.get(url, params={"q": "Seoul"})
+
+        with self.assertRaises(CassetteMissError):
+            http_client.get(url)
+
+    def test_httpx_replay(self):
+        cassette = Cassette(self.path, mode="record")
+        cassette.record("POST", "https://api.openai.com/v1/chat", b'{"model": "m"}', 200, "application/json", b'{"ok": true}', 0.5)
+
+        http_client = install(Cassette(self.path, mode="replay"), requests.Session())
+        response = http_client.post("https://api.openai.com/v1/chat", content=b'{"model":"m"}')
+        assert response.json() == {"ok": True}
+        assert isinstance(response, httpx.Response)
@@ -0,0 +1,26 @@
+import time
+import unittest
+
+from function_calling_weather_bot import metrics
+from function_calling_weather_bot.warmup import Warmer
+
+
+class TestWarmer(unittest.TestCase):
+    def test_warm(self):
+        def fail():
+            raise ConnectionError("refused")
+
+        warmer = Warmer({"ok": lambda: time.sleep(0.01), "down": fail}, keepalive_interval=None)
+        timings = warmer.warm()
+        assert list(timings) == ["ok"]
+        assert timings["ok"] >= 10
+        assert metrics.count("warmup.down.failed") >= 1
+
+    def test_keepalive(self):
+        calls = []
+        warmer = Warmer({"ok": lambda: calls.append(time.monotonic())}, keepalive_interval=0.05)
+        warmer.start()
+        assert warmer.wait(1)
+        time.sleep(0.2)
+        warmer.stop()
+        assert len(calls) >= 2
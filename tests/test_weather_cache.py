@@ -0,0 +1,36 @@
+import unittest
+
+from function_calling_weather_bot import geohash
+from function_calling_weather_bot.utils import WeatherData
+from function_calling_weather_bot.weather_cache import SpatialWeatherCache
+
+
+class TestGeohash(unittest.TestCase):
+    def test_encode_decode(self):
+        assert geohash.encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+        latitude, longitude, _, _ = geohash.decode("u4pruydqqvj")
+        assert abs(latitude - 57.64911) < 1e-4 and abs(longitude - 10.40744) < 1e-4
+
+    def test_neighbors(self):
+        assert sorted(geohash.neighbors("ezs42")) == sorted(
+            ["ezs48", "ezs49", "ezs43", "ezs41", "ezs40", "ezefp", "ezefr", "ezefx"]
+        )
+
+
+class TestSpatialWeatherCache(unittest.TestCase):
+    def test_nearby_and_name_lookups(self):
+        cache = SpatialWeatherCache(precision=5, ttl=60)
+        boise = WeatherData("clear sky", "Boise", "US", "", 291.5, latitude=43.6135, longitude=-116.2035)
+        cache.put(boise, query="Boise")
+
+        # a few km away is served from the same or a neighboring cell
+        assert cache.get_by_point(43.63, -116.24) is boise
+        assert cache.get_by_name("boise") is boise
+        assert cache.get_by_name("Seoul") is None
+        assert cache.get_by_point(37.56, 126.97) is None
+
+    def test_ttl(self):
+        cache = SpatialWeatherCache(ttl=0)
+        cache.put(WeatherData("rain", "Seoul", "KR", "", 285.0, latitude=37.56, longitude=126.97), query="Seoul")
+        cache._cells = {cell: (when - 1, data) for cell, (when, data) in cache._cells.items()}
+        assert cache.get_by_name("Seoul") is None